@@ -1,17 +1,28 @@
+from datetime import date
+
 from flask import Flask
 from flask_cors import CORS
 
 from schema import schema
-from routes import register_routes
+from routes import CACHEABLE_ENDPOINTS, register_routes
+from middleware import register_compression, register_conditional_gets
 from conf import get_config
 from container import Container
 
+
+def response_version() -> str:
+    # overdueLoans defaults to today's date, so its answer can change without a write
+    return f"{Container.data_version()}.{date.today().isoformat()}"
+
+
 def create_app():
     app = Flask(__name__)
     config = get_config()
     Container.init(config)
     CORS(app)
     register_routes(app, schema)
+    register_conditional_gets(app, version=response_version, endpoints=CACHEABLE_ENDPOINTS)
+    register_compression(app)
     return app
     
 app = create_app()
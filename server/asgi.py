@@ -0,0 +1,31 @@
+"""
+Async entry point, needed for GraphQL subscriptions over websockets:
+
+    uvicorn asgi:app --port 5000
+
+/graphql is served by Strawberry's ASGI app (queries over HTTP, subscriptions over the
+graphql-transport-ws and graphql-ws protocols), with the same ETags and 304s as the Flask
+app's /graphql. Every other route is the Flask app.
+"""
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.routing import Mount, Route, WebSocketRoute
+from strawberry.asgi import GraphQL
+
+from app import create_app, response_version
+from middleware import COMPRESSION_MIN_SIZE, ConditionalGetMiddleware
+from schema import schema
+
+graphql_app = GraphQL(schema)
+
+app = Starlette(
+    routes=[
+        Route("/graphql", ConditionalGetMiddleware(graphql_app, version=response_version)),
+        WebSocketRoute("/graphql", graphql_app),
+        Mount("/", WSGIMiddleware(create_app())),
+    ],
+    # For Strawberry's responses; the Flask app's are already encoded and passed through as they are
+    middleware=[Middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)],
+)
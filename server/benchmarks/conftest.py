@@ -0,0 +1,89 @@
+from functools import lru_cache
+from itertools import count
+import os
+from pathlib import Path
+import sys
+from typing import Generator
+
+from flask import Flask
+import pytest
+from flask.testing import FlaskClient
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app import create_app
+from benchmarks.factories import build_loan_payments, build_loans
+from container import Container
+from datastore import InMemoryDataStore
+from models import Loan, LoanPayment
+from services import LoanService
+
+
+# Portfolio sizes (number of loans) to benchmark, e.g. BENCH_SIZES=10000,1000000,10000000
+BENCH_SIZES = [int(size) for size in os.getenv(
+    "BENCH_SIZES", "10000,100000").split(",")]
+
+
+@lru_cache(maxsize=None)
+def _portfolio(size: int) -> tuple[list[Loan], list[LoanPayment]]:
+    # Generated once per size and shared by every benchmark in the session
+    loans = build_loans(size)
+    return loans, build_loan_payments(loans)
+
+
+@pytest.fixture(params=BENCH_SIZES, ids=lambda size: f"{size}_loans")
+def portfolio_size(request: pytest.FixtureRequest) -> int:
+    return request.param
+
+
+@pytest.fixture
+def loan_datastore(portfolio_size: int) -> InMemoryDataStore[Loan]:
+    loans, _ = _portfolio(portfolio_size)
+    # Copy the backing list so benchmarks that add items don't leak into the next one
+    return InMemoryDataStore[Loan](list(loans))
+
+
+@pytest.fixture
+def payment_datastore(portfolio_size: int) -> InMemoryDataStore[LoanPayment]:
+    _, payments = _portfolio(portfolio_size)
+    return InMemoryDataStore[LoanPayment](list(payments))
+
+
+@pytest.fixture(autouse=True)
+def setup_container(
+    loan_datastore: InMemoryDataStore[Loan],
+    payment_datastore: InMemoryDataStore[LoanPayment],
+) -> Generator[None, None, None]:
+    Container.override(
+        loan_datastore=loan_datastore,
+        payment_datastore=payment_datastore,
+    )
+    yield
+    Container.reset()
+
+
+@pytest.fixture(autouse=True)
+def payment_id_counter(monkeypatch: pytest.MonkeyPatch, payment_datastore: InMemoryDataStore[LoanPayment]) -> None:
+    # LoanService hands out ids from a class-level counter that assumes the seed data;
+    # start it after the generated payments so benchmarked inserts don't collide.
+    _, pagination = payment_datastore.get_all(cursor=None, limit=0)
+    monkeypatch.setattr(LoanService, "_id_counter",
+                        count(pagination.total_items + 1))
+
+
+@pytest.fixture
+def loan_service() -> LoanService:
+    return Container.loan_service()
+
+
+@pytest.fixture
+def app() -> Generator[Flask, None, None]:
+    app = create_app()
+    app.config["TESTING"] = True
+    yield app
+
+
+@pytest.fixture
+def client(app: Flask) -> Generator[FlaskClient, None, None]:
+    with app.test_client() as client:
+        yield client
@@ -0,0 +1,61 @@
+"""
+Bulk data generators for the benchmark suite.
+
+The Factory Boy factories in `tests/factories.py` make one round of Faker calls per
+object, which is fine for a handful of records but takes minutes for millions of rows.
+These generators draw names from a small pre-generated pool and everything else from
+a seeded `random.Random`, so large portfolios are cheap and reproducible.
+"""
+import datetime
+import random
+from faker import Faker
+
+from models import Loan, LoanPayment
+
+NAME_POOL_SIZE = 1_000
+BASE_DUE_DATE = datetime.date(2025, 1, 1)
+
+
+def _name_pool(seed: int) -> list[str]:
+    faker = Faker()
+    faker.seed_instance(seed)
+    return [faker.company() for _ in range(NAME_POOL_SIZE)]
+
+
+def build_loans(count: int, seed: int = 0) -> list[Loan]:
+    rng = random.Random(seed)
+    names = _name_pool(seed)
+    return [
+        Loan(
+            id=loan_id,
+            name=rng.choice(names),
+            interest_rate=round(rng.uniform(1.0, 15.0), 2),
+            principal=round(rng.uniform(1_000.0, 100_000.0), 2),
+            due_date=BASE_DUE_DATE + datetime.timedelta(days=rng.randrange(365)),
+        )
+        for loan_id in range(1, count + 1)
+    ]
+
+
+def build_loan_payments(loans: list[Loan], max_per_loan: int = 2, seed: int = 0, paid_ratio: float = 0.8) -> list[LoanPayment]:
+    """
+    Generate between 1 and `max_per_loan` payments for roughly `paid_ratio` of the loans.
+    Payment dates are spread from on time to well past the default threshold so that
+    every `PaymentStatus` is represented.
+    """
+    rng = random.Random(seed)
+    payments: list[LoanPayment] = []
+    next_id = 1
+    for loan in loans:
+        if rng.random() >= paid_ratio:
+            continue
+        for _ in range(rng.randint(1, max_per_loan)):
+            payments.append(LoanPayment(
+                id=next_id,
+                loan_id=loan.id,
+                payment_date=loan.due_date +
+                datetime.timedelta(days=rng.randrange(-10, 60)),
+                amount=round(rng.uniform(100.0, 10_000.0), 2),
+            ))
+            next_id += 1
+    return payments
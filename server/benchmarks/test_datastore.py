@@ -0,0 +1,57 @@
+from itertools import count
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from datastore import InMemoryDataStore, SortKey, encode_cursor
+from models import Loan, LoanPayment
+from benchmarks.factories import BASE_DUE_DATE
+
+
+# Where the cursor points, as a fraction of the portfolio
+CURSOR_DEPTHS = [0.0, 0.5, 0.99]
+
+
+class TestDataStoreBenchmarks:
+    @pytest.mark.parametrize("depth", CURSOR_DEPTHS, ids=lambda depth: f"depth_{depth}")
+    def test_get_all_at_cursor_depth(self, benchmark: BenchmarkFixture, loan_datastore: InMemoryDataStore[Loan], portfolio_size: int, depth: float):
+        cursor = int(portfolio_size * depth) or None
+        items, _ = benchmark(loan_datastore.get_all, cursor=cursor, limit=10)
+        assert len(items) == 10
+
+    @pytest.mark.parametrize("depth", CURSOR_DEPTHS, ids=lambda depth: f"depth_{depth}")
+    def test_get_all_sorted_at_cursor_depth(self, benchmark: BenchmarkFixture, loan_datastore: InMemoryDataStore[Loan], portfolio_size: int, depth: float):
+        order_by = (SortKey("principal", descending=True), SortKey("due_date"))
+        # Builds the sorted index, so the benchmark only measures the bisection and the page
+        ordered, _ = loan_datastore.get_all_sorted(order_by, after=None, limit=portfolio_size)
+        after = encode_cursor(ordered[int(portfolio_size * depth) - 1], order_by) if depth else None
+        items, _ = benchmark(loan_datastore.get_all_sorted, order_by, after=after, limit=10)
+        assert len(items) == 10
+
+    def test_get_all_with_name_filter(self, benchmark: BenchmarkFixture, loan_datastore: InMemoryDataStore[Loan]):
+        target = loan_datastore.get_by_id(1)
+        assert target is not None
+        items, _ = benchmark(loan_datastore.get_all, cursor=None, limit=10,
+                             filter_fn=lambda loan: target.name.lower() in loan.name.lower())
+        assert len(items) > 0
+
+    def test_get_all_with_selective_filter(self, benchmark: BenchmarkFixture, loan_datastore: InMemoryDataStore[Loan]):
+        # Matches almost nothing, so every page is a full scan
+        items, _ = benchmark(loan_datastore.get_all, cursor=None, limit=10,
+                             filter_fn=lambda loan: loan.principal < 1_010)
+        assert isinstance(items, list)
+
+    def test_get_by_id_last_item(self, benchmark: BenchmarkFixture, loan_datastore: InMemoryDataStore[Loan], portfolio_size: int):
+        loan = benchmark(loan_datastore.get_by_id, portfolio_size)
+        assert loan is not None
+
+    def test_add(self, benchmark: BenchmarkFixture, payment_datastore: InMemoryDataStore[LoanPayment], portfolio_size: int):
+        # Payment ids are always below the number of loans * 2, so these never collide
+        ids = count(portfolio_size * 2 + 1)
+
+        def new_payment() -> tuple[tuple[LoanPayment], dict[str, object]]:
+            payment = LoanPayment(id=next(ids), loan_id=1,
+                                  payment_date=BASE_DUE_DATE, amount=100.0)
+            return (payment,), {}
+
+        benchmark.pedantic(payment_datastore.add, setup=new_payment, rounds=50)
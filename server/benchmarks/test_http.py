@@ -0,0 +1,39 @@
+from flask.testing import FlaskClient
+from pytest_benchmark.fixture import BenchmarkFixture
+from werkzeug.test import TestResponse
+
+from loadtest import LOANS_QUERY, LOAN_PAYMENTS_QUERY
+
+
+class TestHttpBenchmarks:
+    def test_graphql_loans(self, benchmark: BenchmarkFixture, client: FlaskClient):
+        def request() -> TestResponse:
+            return client.post("/graphql", json={"query": LOANS_QUERY, "variables": {"limit": 10}})
+
+        response = benchmark(request)
+        assert response.status_code == 200
+
+    def test_graphql_loans_with_filter(self, benchmark: BenchmarkFixture, client: FlaskClient):
+        variables = {"limit": 10, "filter": {"principal": 50_000.0}}
+
+        def request() -> TestResponse:
+            return client.post("/graphql", json={"query": LOANS_QUERY, "variables": variables})
+
+        response = benchmark(request)
+        assert response.status_code == 200
+
+    def test_graphql_loan_payments(self, benchmark: BenchmarkFixture, client: FlaskClient, portfolio_size: int):
+        variables = {"loanId": portfolio_size, "limit": 10}
+
+        def request() -> TestResponse:
+            return client.post("/graphql", json={"query": LOAN_PAYMENTS_QUERY, "variables": variables})
+
+        response = benchmark(request)
+        assert response.status_code == 200
+
+    def test_rest_add_payment(self, benchmark: BenchmarkFixture, client: FlaskClient, portfolio_size: int):
+        def request() -> TestResponse:
+            return client.post("/payment", json={"loan_id": portfolio_size, "amount": 100.0})
+
+        response = benchmark.pedantic(request, rounds=50)
+        assert response.status_code == 201
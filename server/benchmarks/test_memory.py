@@ -0,0 +1,99 @@
+from dataclasses import dataclass
+import datetime
+import tracemalloc
+from typing import Callable, Optional, Sized
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from benchmarks.factories import BASE_DUE_DATE, build_loan_payments, build_loans
+from datastore import DataStore, InMemoryDataStore
+from models import Loan, LoanPayment, PaymentStatus
+from services import LoanService, PaymentOfLoan
+from status_index import payment_status
+
+PAGE_SIZE = 1_000
+LOAN_ID = 1
+
+
+@dataclass
+class _DataclassPaymentResponse:
+    """LoanPaymentResponse as it was before the NamedTuple records: a dataclass copying its loan's fields."""
+    id: int
+    name: str
+    interest_rate: float
+    principal: float
+    due_date: datetime.date
+    status: PaymentStatus
+    amount: float
+    payment_date: Optional[datetime.date] = None
+
+
+def _bytes_per_item(build: Callable[[], Sized]) -> float:
+    """Memory still allocated by what `build` returns, per item."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = build()
+        return (tracemalloc.get_traced_memory()[0] - before) / len(items)
+    finally:
+        tracemalloc.stop()
+
+
+def _page_datastores() -> tuple[InMemoryDataStore[Loan], InMemoryDataStore[LoanPayment]]:
+    loans = build_loans(1)
+    payments = [LoanPayment(id=payment_id, loan_id=LOAN_ID, payment_date=BASE_DUE_DATE, amount=100.0)
+                for payment_id in range(1, PAGE_SIZE + 1)]
+    return InMemoryDataStore(loans), InMemoryDataStore(payments)
+
+
+def _dataclass_loan_payments(loan_data: DataStore[Loan], payment_data: DataStore[LoanPayment]) -> list[_DataclassPaymentResponse]:
+    """The page LoanService.get_loan_payments builds, read the same way but made of the old dataclass records."""
+    loan = loan_data.get_by_id(LOAN_ID)
+    assert loan is not None
+    payments, _ = payment_data.get_all_in_partition(
+        LOAN_ID, cursor=None, limit=PAGE_SIZE, filter_fn=PaymentOfLoan(LOAN_ID))
+    return [
+        _DataclassPaymentResponse(
+            id=payment.id,
+            name=loan.name,
+            interest_rate=loan.interest_rate,
+            principal=loan.principal,
+            due_date=loan.due_date,
+            status=payment_status(loan.due_date, payment.payment_date),
+            amount=payment.amount,
+            payment_date=payment.payment_date,
+        )
+        for payment in payments
+    ]
+
+
+class TestMemoryBenchmarks:
+    def test_record_size(self, benchmark: BenchmarkFixture, portfolio_size: int):
+        loans = build_loans(portfolio_size)
+        benchmark.extra_info["loan_bytes"] = _bytes_per_item(
+            lambda: build_loans(portfolio_size))
+        benchmark.extra_info["payment_bytes"] = _bytes_per_item(
+            lambda: build_loan_payments(loans))
+        # Storage records must stay free of a per-instance __dict__
+        assert not hasattr(loans[0], "__dict__")
+
+        # What the records save where it counts: allocating a loanPayments page
+        loan_data, payment_data = _page_datastores()
+        loan_service = LoanService(loan_data, payment_data)
+        response_bytes = _bytes_per_item(
+            lambda: loan_service.get_loan_payments(LOAN_ID, cursor=None, limit=PAGE_SIZE)[0])
+        dataclass_bytes = _bytes_per_item(
+            lambda: _dataclass_loan_payments(loan_data, payment_data))
+        benchmark.extra_info["response_bytes"] = response_bytes
+        benchmark.extra_info["dataclass_response_bytes"] = dataclass_bytes
+        benchmark.extra_info["allocation_savings"] = 1 - response_bytes / dataclass_bytes
+
+        items, _ = benchmark(loan_service.get_loan_payments,
+                             LOAN_ID, cursor=None, limit=PAGE_SIZE)
+        assert len(items) == PAGE_SIZE
+
+    def test_dataclass_loan_payments_page(self, benchmark: BenchmarkFixture):
+        # Baseline for test_record_size's timing: the same page made of the old dataclass records
+        loan_data, payment_data = _page_datastores()
+        items = benchmark(_dataclass_loan_payments, loan_data, payment_data)
+        assert len(items) == PAGE_SIZE
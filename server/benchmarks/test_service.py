@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from models import LoanFilter, LoanPaymentInput
+from services import LoanService
+
+
+class TestLoanServiceBenchmarks:
+    def test_get_loans_first_page(self, benchmark: BenchmarkFixture, loan_service: LoanService):
+        items, _ = benchmark(loan_service.get_loans,
+                             cursor=None, limit=10, filter=None)
+        assert len(items) == 10
+
+    def test_get_loans_with_filter(self, benchmark: BenchmarkFixture, loan_service: LoanService):
+        filter_obj = LoanFilter(principal=50_000.0, interest_rate=7.5)
+        items, _ = benchmark(loan_service.get_loans,
+                             cursor=None, limit=10, filter=filter_obj)
+        assert len(items) == 10
+
+    def test_get_loan_payments(self, benchmark: BenchmarkFixture, loan_service: LoanService, portfolio_size: int):
+        # The last loan's payments sit at the end of the payment list
+        items, _ = benchmark(loan_service.get_loan_payments,
+                             loan_id=portfolio_size, cursor=None, limit=10)
+        assert len(items) >= 1
+
+    def test_add_loan_payment(self, benchmark: BenchmarkFixture, loan_service: LoanService, portfolio_size: int):
+        payment_input = LoanPaymentInput(loan_id=portfolio_size, amount=100.0)
+        benchmark.pedantic(loan_service.add_loan_payment,
+                           args=(payment_input,), rounds=50)
+
+    def test_add_loan_payment_concurrent(self, benchmark: BenchmarkFixture, loan_service: LoanService, portfolio_size: int):
+        # 16 writers at once, which the write pipeline commits in batches
+        payment_input = LoanPaymentInput(loan_id=portfolio_size, amount=100.0)
+
+        def write_burst() -> None:
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                list(pool.map(lambda _: loan_service.add_loan_payment(
+                    payment_input), range(64)))
+
+        benchmark.pedantic(write_burst, rounds=10)
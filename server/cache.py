@@ -0,0 +1,126 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+R = TypeVar("R")
+
+
+class TTLCache(Generic[K, V]):
+    """Thread-safe LRU cache of at most `max_size` entries, each expiring `ttl` seconds after it was set."""
+
+    def __init__(self, max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic) -> None:
+        if max_size <= 0:
+            raise ValueError("max_size must be a positive integer.")
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + self._ttl, value)
+            self._entries.move_to_end(key)
+            # Expired entries are dropped lazily; when full, evict least recently used first
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[1] if entry is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _Call(Generic[R]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[R] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[K, R]):
+    """Collapses concurrent calls for the same key into one: the first caller runs, the rest wait for its outcome."""
+
+    def __init__(self) -> None:
+        self._calls: dict[K, _Call[R]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: K, fn: Callable[[], R]) -> R:
+        """Returns fn's result, or raises its error, whichever caller ran it."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call[R]()
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result  # type: ignore[return-value]
+
+
+class IdempotencyCache(Generic[K, V]):
+    """
+    Remembers the response to each idempotency key, so retries are answered without
+    running the request again. Concurrent requests with the same key run it once.
+    Failed requests are not remembered.
+    """
+
+    def __init__(self, max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self._responses = TTLCache[K, tuple[object, V]](max_size, ttl, clock)
+        self._in_flight = SingleFlight[K, tuple[object, V]]()
+
+    def run(self, key: K, request: object, fn: Callable[[], V]) -> V:
+        """Runs `fn` for the first request with this key; later ones must be equal to it and get its response."""
+        cached = self._responses.get(key)
+        if cached is None:
+            cached = self._in_flight.do(
+                key, lambda: self._run_once(key, request, fn))
+
+        cached_request, response = cached
+        if cached_request != request:
+            raise ValueError(
+                "Idempotency key was already used for a different request.")
+        return response
+
+    def _run_once(self, key: K, request: object, fn: Callable[[], V]) -> tuple[object, V]:
+        # A call that finished between the lookup in run() and joining the flight has already been cached
+        cached = self._responses.get(key)
+        if cached is not None:
+            return cached
+        entry = (request, fn())
+        self._responses.set(key, entry)
+        return entry
@@ -6,6 +6,11 @@ from models import Config
 def get_config() -> Config:
     datastore_type = os.getenv("DATASTORE_TYPE", "in_memory")
     database_url = os.getenv("DATABASE_URL", None)
+    payment_shards = os.getenv("PAYMENT_SHARDS", "1")
+    cache_size = os.getenv("DATASTORE_CACHE_SIZE", "0")
+    cache_ttl = os.getenv("DATASTORE_CACHE_TTL", "30")
+    job_workers = os.getenv("JOB_WORKERS", "2")
+    job_processes = os.getenv("JOB_PROCESSES", "0")
     
     if datastore_type not in ("in_memory", "database"):
         raise ValueError(
@@ -17,7 +22,41 @@ def get_config() -> Config:
             "DATABASE_URL must be set when DATASTORE_TYPE is 'database'."
         )
     
+    if not payment_shards.isdigit() or int(payment_shards) < 1:
+        raise ValueError(
+            f"Invalid PAYMENT_SHARDS: {payment_shards}. Must be a positive integer."
+        )
+
+    if not cache_size.isdigit():
+        raise ValueError(
+            f"Invalid DATASTORE_CACHE_SIZE: {cache_size}. Must be a non-negative integer."
+        )
+
+    try:
+        cache_ttl_seconds = float(cache_ttl)
+    except ValueError:
+        cache_ttl_seconds = 0.0
+    if cache_ttl_seconds <= 0:
+        raise ValueError(
+            f"Invalid DATASTORE_CACHE_TTL: {cache_ttl}. Must be a positive number of seconds."
+        )
+
+    if not job_workers.isdigit() or int(job_workers) < 1:
+        raise ValueError(
+            f"Invalid JOB_WORKERS: {job_workers}. Must be a positive integer."
+        )
+
+    if not job_processes.isdigit():
+        raise ValueError(
+            f"Invalid JOB_PROCESSES: {job_processes}. Must be a non-negative integer."
+        )
+
     return Config(
         datastore_type=datastore_type,
-        database_url=database_url
+        database_url=database_url,
+        payment_shards=int(payment_shards),
+        cache_size=int(cache_size),
+        cache_ttl=cache_ttl_seconds,
+        job_workers=int(job_workers),
+        job_processes=int(job_processes),
     )
\ No newline at end of file
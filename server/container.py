@@ -1,11 +1,22 @@
-from typing import Optional
+from typing import Iterator, Optional
+import uuid
 
 from models import Config, Loan, LoanPayment
-from datastore import InMemoryDataStore, DataStore
+from datastore import CachingDataStore, InMemoryDataStore, DataStore, ShardedDataStore
+from jobs import JobRunner, JobStore
 from seed import loans, loan_payments
 from services import LoanService
 
 
+# Payments are partitioned by loan, so one loan's payments can be read without scanning the rest
+def payment_loan_id(payment: LoanPayment) -> int:
+    return payment.loan_id
+
+
+def _job_runner(config: Config, store: Optional[JobStore]) -> JobRunner:
+    return JobRunner(max_workers=config.job_workers, processes=config.job_processes, store=store)
+
+
 class Container:
     """
     Simple DI container.
@@ -15,26 +26,66 @@ class Container:
 
     _loan_datastore: Optional[DataStore[Loan]] = None
     _payment_datastore: Optional[DataStore[LoanPayment]] = None
+    _payment_ids: Optional[Iterator[int]] = None
     _loan_service: Optional[LoanService] = None
+    _job_runner: Optional[JobRunner] = None
+    _job_store: Optional[JobStore] = None
+    # Tells data versions apart across restarts and overrides, which start counting from 0 again
+    _epoch = uuid.uuid4().hex[:8]
 
     @classmethod
     def reset(cls) -> None:
         cls._loan_datastore = None
         cls._payment_datastore = None
+        cls._payment_ids = None
         cls._loan_service = None
+        cls._job_store = None
+        cls._epoch = uuid.uuid4().hex[:8]
+        if cls._job_runner is not None:
+            cls._job_runner.shutdown(wait=False)
+            cls._job_runner = None
 
     @classmethod
     def init(cls, config: Config) -> None:
-        # Skip if already initialized
+        # Keep datastores set by override(), e.g. multi-process workers' replicas, but still cache them
         if cls._loan_datastore is not None and cls._payment_datastore is not None:
+            if cls._job_runner is None:
+                cls._job_runner = _job_runner(config, cls._job_store)
+            cls._cache(config)
             return
         cls.reset()
+        cls._job_runner = _job_runner(config, None)
         if config.datastore_type == "in_memory":
             cls._loan_datastore = InMemoryDataStore[Loan](
                 initial_items=list(loans))
-            cls._payment_datastore = InMemoryDataStore[LoanPayment](
-                initial_items=list(loan_payments)
-            )
+            if config.payment_shards > 1:
+                sharded = ShardedDataStore[LoanPayment](
+                    shards=[InMemoryDataStore[LoanPayment](initial_items=[], partition_key=payment_loan_id)
+                            for _ in range(config.payment_shards)],
+                    partition_key=payment_loan_id,
+                )
+                for payment in loan_payments:
+                    sharded.add(payment)
+                cls._payment_datastore = sharded
+            else:
+                cls._payment_datastore = InMemoryDataStore[LoanPayment](
+                    initial_items=list(loan_payments),
+                    partition_key=payment_loan_id,
+                )
+        cls._cache(config)
+
+    @classmethod
+    def _cache(cls, config: Config) -> None:
+        if config.cache_size <= 0 or cls._loan_datastore is None or cls._payment_datastore is None:
+            return
+        # init() runs again for every app created on the same datastores; wrap them once
+        if isinstance(cls._loan_datastore, CachingDataStore):
+            return
+        cls._loan_datastore = CachingDataStore[Loan](
+            cls._loan_datastore, max_size=config.cache_size, ttl=config.cache_ttl)
+        cls._payment_datastore = CachingDataStore[LoanPayment](
+            cls._payment_datastore, max_size=config.cache_size, ttl=config.cache_ttl)
+        cls._loan_service = None
 
     @classmethod
     def loan_service(cls) -> LoanService:
@@ -46,19 +97,42 @@ class Container:
             cls._loan_service = LoanService(
                 loan_data=cls._loan_datastore,
                 loan_payment_data=cls._payment_datastore,
+                payment_ids=cls._payment_ids,
             )
 
         return cls._loan_service
 
+    @classmethod
+    def job_runner(cls) -> JobRunner:
+        if cls._job_runner is None:
+            cls._job_runner = JobRunner(store=cls._job_store)
+        return cls._job_runner
+
+    @classmethod
+    def data_version(cls) -> str:
+        """Changes whenever a loan or payment is added."""
+        if cls._loan_datastore is None or cls._payment_datastore is None:
+            raise ValueError("Container not initialized. Call init() first.")
+        return f"{cls._epoch}.{cls._loan_datastore.version}.{cls._payment_datastore.version}"
+
     @classmethod
     def override(
         cls,
         loan_datastore: Optional[DataStore[Loan]] = None,
         payment_datastore: Optional[DataStore[LoanPayment]] = None,
+        payment_ids: Optional[Iterator[int]] = None,
+        epoch: Optional[str] = None,
+        job_store: Optional[JobStore] = None,
     ) -> None:
         cls.reset()
+        # Worker processes serving the same data pass the same epoch, so they tag it alike
+        if epoch is not None:
+            cls._epoch = epoch
         if loan_datastore is not None:
             cls._loan_datastore = loan_datastore
         if payment_datastore is not None:
             cls._payment_datastore = payment_datastore
+        cls._payment_ids = payment_ids
+        # Multi-process deployments pass a store shared by all workers, so any of them can answer a poll
+        cls._job_store = job_store
         cls._loan_service = None
@@ -1,24 +1,313 @@
 from abc import abstractmethod
-from typing import Callable, Generic, Optional, TypeVar, Protocol
+import asyncio
+import base64
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from functools import partial, total_ordering
+import heapq
+from itertools import islice
+import json
+import logging
+import threading
+import time
+from types import BuiltinFunctionType, FunctionType, MethodType, TracebackType
+from typing import Any, AsyncIterator, Callable, Generic, Hashable, NamedTuple, Optional, Type, TypeVar, Protocol
 
+from cache import SingleFlight, TTLCache
 from models import PaginationResult
 
 
 class Identifiable(Protocol):
-    id: int
+    @property
+    def id(self) -> int: ...
 
 
 T = TypeVar('T', bound=Identifiable)
 
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_LIMIT = 10
+# Items buffered per change feed subscriber before the oldest are dropped
+DEFAULT_MAX_PENDING = 100
+# Sorted indexes an InMemoryDataStore keeps at once; the least recently used is dropped first
+MAX_SORTED_INDEXES = 8
+
+
+class FeedSubscription(Generic[T]):
+    """
+    Async iterator over items published to a ChangeFeed after subscribing.
+    Holds at most `max_pending` undelivered items; when a slow consumer falls further
+    behind, the oldest are dropped and counted in `dropped` so publishers never block.
+    """
+
+    def __init__(self, feed: "ChangeFeed[T]", filter_fn: Optional[Callable[[T], bool]], max_pending: int) -> None:
+        self._feed = feed
+        self._filter_fn = filter_fn
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[T] = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def _publish(self, item: T) -> None:
+        # Called from the publishing thread, the queue is only touched on the subscriber's loop
+        if self._filter_fn is None or self._filter_fn(item):
+            try:
+                self._loop.call_soon_threadsafe(self._offer, item)
+            except RuntimeError:
+                # The subscriber's loop closed without closing the subscription; nobody can read it anymore
+                self.close()
+
+    def _offer(self, item: T) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def __aiter__(self) -> AsyncIterator[T]:
+        return self
+
+    async def __anext__(self) -> T:
+        return await self._queue.get()
+
+    def close(self) -> None:
+        self._feed.unlisten(self._publish)
+
+    def __enter__(self) -> "FeedSubscription[T]":
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]], exc: Optional[BaseException], traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+
+class ChangeFeed(Generic[T]):
+    """In-process pub/sub of the items added to a datastore."""
+
+    def __init__(self) -> None:
+        self._listeners: list[Callable[[T], None]] = []
+        self._lock = threading.Lock()
+        # Number of items published so far
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def listen(self, callback: Callable[[T], None]) -> None:
+        """Call `callback` synchronously, in the writer's thread, with every added item."""
+        with self._lock:
+            self._listeners = [*self._listeners, callback]
+
+    def unlisten(self, callback: Callable[[T], None]) -> None:
+        with self._lock:
+            self._listeners = [
+                listener for listener in self._listeners if listener != callback]
+
+    def subscribe(self, filter_fn: Optional[Callable[[T], bool]] = None, max_pending: int = DEFAULT_MAX_PENDING) -> FeedSubscription[T]:
+        """Async subscription for the running event loop. Close it (or use it as a context manager) when done."""
+        subscription = FeedSubscription[T](self, filter_fn, max_pending)
+        self.listen(subscription._publish)
+        return subscription
+
+    def publish(self, item: T) -> None:
+        with self._lock:
+            self._version += 1
+        # The listener list is replaced, never mutated, so it can be iterated without the lock
+        for listener in self._listeners:
+            # The item is already stored: a failing listener must neither fail the write nor starve the others
+            try:
+                listener(item)
+            except Exception:
+                logger.exception("Change feed listener %r failed", listener)
+
+
+class SortKey(NamedTuple):
+    field: str
+    descending: bool = False
+
+
+# Fields to sort by, most significant first. Ties are always broken by ascending id.
+Ordering = tuple[SortKey, ...]
+
+# Position of an item in an ordering: one value per SortKey, then the item's id
+EntryKey = tuple[Any, ...]
+
+
+@total_ordering
+class _Descending:
+    """Wraps a value so that it sorts in reverse, letting one key mix ascending and descending fields."""
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and self.value == other.value
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.value < self.value
+
+    def __hash__(self) -> int:
+        return hash(self.value)
+
+
+def entry_key(item: Identifiable, ordering: Ordering) -> EntryKey:
+    return _wrap([getattr(item, key.field) for key in ordering], ordering) + (item.id,)
+
+
+def _wrap(values: list[Any], ordering: Ordering) -> tuple[Any, ...]:
+    # (is None, value): missing values (e.g. an unpaid payment's date) sort after the rest instead of failing to compare
+    return tuple(_Descending((value is None, value)) if key.descending else (value is None, value)
+                 for value, key in zip(values, ordering))
+
+
+def encode_cursor(item: Identifiable, ordering: Ordering) -> str:
+    """Opaque cursor pointing just after `item` in `ordering`: base64 JSON of its sort values and id."""
+    payload = {
+        "order": [_order_name(key) for key in ordering],
+        "key": [_encode_value(getattr(item, key.field)) for key in ordering],
+        "id": item.id,
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str, ordering: Ordering) -> EntryKey:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        order, values, item_id = payload["order"], payload["key"], payload["id"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor.")
+    if order != [_order_name(key) for key in ordering]:
+        raise ValueError("Cursor does not match the requested order.")
+    if not isinstance(values, list) or len(values) != len(ordering) or not isinstance(item_id, int):
+        raise ValueError("Invalid cursor.")
+    return _wrap([_decode_value(value) for value in values], ordering) + (item_id,)
+
+
+def _order_name(key: SortKey) -> str:
+    return f"-{key.field}" if key.descending else key.field
+
+
+# JSON has no date type, so dates are tagged
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, date):
+        return {"date": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        try:
+            return date.fromisoformat(value["date"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Invalid cursor.")
+    return value
+
+
+class SortedIndex(Generic[T]):
+    """
+    Items kept sorted by an ordering, with their keys in a parallel list, so the start of
+    any page, however deep, is found by bisecting for the cursor's key.
+    """
+
+    def __init__(self, ordering: Ordering) -> None:
+        self._ordering = ordering
+        self._keys: list[EntryKey] = []
+        self._items: list[T] = []
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def insert_many(self, items: list[T]) -> None:
+        if len(items) > len(self._items) // 8:
+            # Big batches (including the first build) are cheaper to sort in than to insert one by one
+            entries = sorted(zip(self._keys + [entry_key(item, self._ordering) for item in items],
+                                 self._items + items), key=lambda entry: entry[0])
+            self._keys = [key for key, _ in entries]
+            self._items = [item for _, item in entries]
+            return
+        for item in items:
+            key = entry_key(item, self._ordering)
+            index = bisect_right(self._keys, key)
+            self._keys.insert(index, key)
+            self._items.insert(index, item)
+
+    def page(self, after: Optional[EntryKey], limit: int, filter_fn: Optional[Callable[[T], bool]] = None) -> tuple[list[T], PaginationResult]:
+        try:
+            start = 0 if after is None else bisect_right(self._keys, after)
+        except TypeError:
+            # The cursor's values can't be compared with this index's keys
+            raise ValueError("Invalid cursor.")
+
+        if filter_fn is None:
+            page = self._items[start:start + limit]
+            total_items = len(self._items)
+            has_more = start + limit < total_items
+        else:
+            # Counting the matches needs one pass over the index, like get_all, but no sort
+            page = []
+            total_items = 0
+            has_more = False
+            for index, item in enumerate(self._items):
+                if not filter_fn(item):
+                    continue
+                total_items += 1
+                if index >= start:
+                    if len(page) < limit:
+                        page.append(item)
+                    else:
+                        has_more = True
+
+        end_cursor = encode_cursor(page[-1], self._ordering) if has_more and page else None
+        return page, PaginationResult(total_items=total_items, end_cursor=end_cursor)
 
 
 class DataStore(Generic[T]):
+    def __init__(self) -> None:
+        self._changes = ChangeFeed[T]()
+
+    @property
+    def changes(self) -> ChangeFeed[T]:
+        """Feed of items added to this datastore."""
+        return self._changes
+
+    @property
+    def version(self) -> int:
+        """Bumped by every add, so equal versions mean the datastore holds the same items."""
+        return self.changes.version
+
+    def refresh(self) -> None:
+        """
+            Catch up with items added elsewhere, publishing them to the change feed. Stores
+            that see every add as it happens, which is all of them but replicas, have nothing to do.
+        """
+
     @abstractmethod
     def add(self, item: T) -> T:
         pass
 
+    def add_many(self, items: list[T]) -> list[T]:
+        """
+            Add several items at once: either all of them are added, or a ValueError is raised and none are.
+            Stores that can write a batch more cheaply than item by item should override this.
+        """
+        _check_new(items, self.existing_ids)
+        return [self.add(item) for item in items]
+
+    def existing_ids(self, item_ids: set[int]) -> set[int]:
+        """Which of `item_ids` are already stored. Stores that can look them all up at once should override this."""
+        return {item_id for item_id in item_ids if self.get_by_id(item_id) is not None}
+
+    def add_idempotent(self, item: T, idempotency_key: str, request: object) -> T:
+        """
+            Add an item on behalf of a request that may be retried with the same idempotency key.
+            Callers dedupe retries within their own process; stores shared by several processes
+            override this to dedupe them where the writes are applied, across all of them.
+        """
+        return self.add(item)
+
     @abstractmethod
     def get_all(self, cursor: Optional[int], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None) -> tuple[list[T], PaginationResult]:
         """
@@ -38,19 +327,124 @@ class DataStore(Generic[T]):
     def get_by_id(self, item_id: int) -> Optional[T]:
         pass
 
+    def get_all_in_partition(self, partition_key: int, cursor: Optional[int], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None) -> tuple[list[T], PaginationResult]:
+        """
+            Same as get_all, for items that all share one partition key (e.g. payments of one loan).
+            filter_fn must still select the partition; partitioned stores use the key to skip every other partition.
+        """
+        return self.get_all(cursor=cursor, limit=limit, filter_fn=filter_fn)
+
+    def get_all_sorted(self, order_by: Ordering, after: Optional[str], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None, partition_key: Optional[int] = None) -> tuple[list[T], PaginationResult]:
+        """
+            Same as get_all, but items come sorted by `order_by` (then by id) and are paged with opaque cursors.
+
+        Args:
+            order_by (Ordering): The fields to sort by, most significant first.
+            after (Optional[str]): The end_cursor of the previous page.
+            limit (Optional[int]): Maximum number of items to return. If None, a default limit is applied.
+            filter_fn (Optional[Callable[[T], bool]], optional): A function to filter items. Defaults to None.
+            partition_key (Optional[int], optional): Set when filter_fn only selects items of this partition, as in get_all_in_partition.
+
+        Returns:
+            tuple[list[T], PaginationResult]: The page, with end_cursor set when there are more items.
+
+        This fallback sorts every matching item on each call; stores should keep sorted indexes instead.
+        """
+        after_key = decode_cursor(after, order_by) if after is not None else None
+        _, pagination = self.get_all(cursor=None, limit=0, filter_fn=filter_fn)
+        items, _ = self.get_all(
+            cursor=None, limit=pagination.total_items, filter_fn=filter_fn)
+        index = SortedIndex[T](order_by)
+        index.insert_many(items)
+        return index.page(after_key, limit if limit is not None else DEFAULT_LIMIT)
+
+
+def all_items(datastore: DataStore[T]) -> list[T]:
+    """Every item in the datastore, in one page."""
+    _, pagination = datastore.get_all(cursor=None, limit=0)
+    items, _ = datastore.get_all(cursor=None, limit=pagination.total_items)
+    return items
+
+
+def _check_new(items: list[T], existing_ids: Callable[[set[int]], set[int]]) -> None:
+    """Raises ValueError if the batch repeats an id or has one that is already stored."""
+    counts = Counter(item.id for item in items)
+    duplicates = {item_id for item_id, seen in counts.items() if seen > 1} | existing_ids(set(counts))
+    if duplicates:
+        raise ValueError(
+            f"Items with ids {sorted(duplicates)} already exist.")
+
+
+def _merge_pages(pages: list[tuple[list[T], PaginationResult]], ordering: Ordering, limit: int) -> tuple[list[T], PaginationResult]:
+    """Merges pages of the same sorted query over disjoint sets of items into one page."""
+    if len(pages) == 1:
+        return pages[0]
+    merged = list(islice(heapq.merge(
+        *(items for items, _ in pages), key=lambda item: entry_key(item, ordering)), limit + 1))
+    result_items = merged[:limit]
+    has_more = len(merged) > limit or any(
+        pagination.end_cursor is not None for _, pagination in pages)
+    end_cursor = encode_cursor(result_items[-1], ordering) if has_more and result_items else None
+    total_items = sum(pagination.total_items for _, pagination in pages)
+    return result_items, PaginationResult(total_items=total_items, end_cursor=end_cursor)
+
+
+class _SortedIndexes(Generic[T]):
+    """
+    One ordering's SortedIndex per partition. Items appended to the store's list, by add() or
+    directly (as replicas do), are indexed when the next sorted read catches up.
+    """
+
+    def __init__(self, ordering: Ordering, partition_key: Optional[Callable[[T], int]]) -> None:
+        self.ordering = ordering
+        self._partition_key = partition_key
+        self._indexed = 0
+        self.partitions: dict[Optional[int], SortedIndex[T]] = {}
+
+    def catch_up(self, items: list[T]) -> None:
+        new_items = items[self._indexed:]
+        self._indexed += len(new_items)
+        by_partition: dict[Optional[int], list[T]] = {}
+        for item in new_items:
+            partition = self._partition_key(
+                item) if self._partition_key is not None else None
+            by_partition.setdefault(partition, []).append(item)
+        for partition, partition_items in by_partition.items():
+            if partition not in self.partitions:
+                self.partitions[partition] = SortedIndex[T](self.ordering)
+            self.partitions[partition].insert_many(partition_items)
+
 
 # Uses the in-memory seed data for storage
 class InMemoryDataStore(DataStore[T]):
-    def __init__(self, initial_items: list[T]) -> None:
+    def __init__(self, initial_items: list[T], partition_key: Optional[Callable[[T], int]] = None) -> None:
+        super().__init__()
         self._items = initial_items
+        # With a partition key, sorted reads of one partition only look at that partition's items
+        self._partition_key = partition_key
+        # Built on the first sorted read of each ordering, least recently used first
+        self._sorted_indexes: dict[Ordering, _SortedIndexes[T]] = {}
+        self._sorted_lock = threading.Lock()
 
     def add(self, item: T) -> T:
         existing_id = self.get_by_id(item.id)
         if existing_id is not None:
             raise ValueError(f"Item with id {item.id} already exists.")
         self._items.append(item)
+        self.changes.publish(item)
         return item
 
+    def add_many(self, items: list[T]) -> list[T]:
+        _check_new(items, self.existing_ids)
+        self._items.extend(items)
+        for item in items:
+            self.changes.publish(item)
+        return items
+
+    def existing_ids(self, item_ids: set[int]) -> set[int]:
+        # One scan over the existing items for the whole batch, instead of one per item
+        return {item.id for item in self._items if item.id in item_ids}
+
     def get_all(self, cursor: Optional[int], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None) -> tuple[list[T], PaginationResult]:
         filtered_items = self._items
         if filter_fn is not None:
@@ -79,3 +473,273 @@ class InMemoryDataStore(DataStore[T]):
             if item.id == item_id:
                 return item
         return None
+
+    def get_all_sorted(self, order_by: Ordering, after: Optional[str], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None, partition_key: Optional[int] = None) -> tuple[list[T], PaginationResult]:
+        after_key = decode_cursor(after, order_by) if after is not None else None
+        result_limit = limit if limit is not None else DEFAULT_LIMIT
+        with self._sorted_lock:
+            indexes = self._sorted_indexes.pop(order_by, None)
+            if indexes is None:
+                indexes = _SortedIndexes[T](order_by, self._partition_key)
+                if len(self._sorted_indexes) >= MAX_SORTED_INDEXES:
+                    del self._sorted_indexes[next(iter(self._sorted_indexes))]
+            self._sorted_indexes[order_by] = indexes
+            indexes.catch_up(self._items)
+
+            if partition_key is not None and self._partition_key is not None:
+                index = indexes.partitions.get(partition_key)
+                if index is None:
+                    return [], PaginationResult(total_items=0)
+                return index.page(after_key, result_limit, filter_fn)
+            pages = [index.page(after_key, result_limit, filter_fn)
+                     for index in indexes.partitions.values()]
+        if not pages:
+            return [], PaginationResult(total_items=0)
+        return _merge_pages(pages, order_by, result_limit)
+
+
+# Partitions items across several datastores, e.g. payments by loan_id
+class ShardedDataStore(DataStore[T]):
+    def __init__(self, shards: list[DataStore[T]], partition_key: Callable[[T], int]) -> None:
+        if not shards:
+            raise ValueError("ShardedDataStore needs at least one shard.")
+        super().__init__()
+        self._shards = shards
+        self._partition_key = partition_key
+        # Writes to the same shard are serialized, writes to different shards run in parallel
+        self._locks = [threading.Lock() for _ in shards]
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(shards), thread_name_prefix="datastore-shard")
+
+    def _shard_index(self, partition_key: int) -> int:
+        return partition_key % len(self._shards)
+
+    def add(self, item: T) -> T:
+        # Ids are only checked for uniqueness within the item's shard
+        index = self._shard_index(self._partition_key(item))
+        with self._locks[index]:
+            added = self._shards[index].add(item)
+        self.changes.publish(added)
+        return added
+
+    def add_many(self, items: list[T]) -> list[T]:
+        """
+            All or nothing, like DataStore.add_many: each shard checks its part of the batch
+            before any is added. Then the shards add their parts in parallel.
+        """
+        parts: dict[int, list[T]] = defaultdict(list)
+        for item in items:
+            parts[self._shard_index(self._partition_key(item))].append(item)
+        indexes = sorted(parts)
+
+        # Taken in shard order, so batches spanning the same shards can't deadlock
+        for index in indexes:
+            self._locks[index].acquire()
+        try:
+            list(self._executor.map(
+                lambda index: _check_new(parts[index], self._shards[index].existing_ids), indexes))
+            list(self._executor.map(
+                lambda index: self._shards[index].add_many(parts[index]), indexes))
+        finally:
+            for index in indexes:
+                self._locks[index].release()
+
+        for item in items:
+            self.changes.publish(item)
+        return items
+
+    def get_all(self, cursor: Optional[int], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None) -> tuple[list[T], PaginationResult]:
+        """
+            Fans out to every shard and merges the pages by id, so items come back in id order
+            and the cursor (the id of the last item returned) is valid across shards.
+        """
+        result_limit = limit if limit is not None else DEFAULT_LIMIT
+        pages = list(self._executor.map(
+            lambda shard: self._shard_page(shard, cursor, result_limit, filter_fn), self._shards))
+
+        total_items = sum(total for _, total, _ in pages)
+        remaining = sum(after_cursor for _, _, after_cursor in pages)
+        result_items = list(islice(heapq.merge(
+            *(items for items, _, _ in pages), key=lambda item: item.id), result_limit))
+
+        has_more = result_limit < remaining
+        next_cursor = result_items[-1].id if has_more and len(result_items) > 0 else None
+        return result_items, PaginationResult(total_items=total_items, next_cursor=next_cursor)
+
+    def _shard_page(self, shard: DataStore[T], cursor: Optional[int], limit: int, filter_fn: Optional[Callable[[T], bool]]) -> tuple[list[T], int, int]:
+        """Returns the shard's `limit` smallest ids after the cursor (sorted), its total and its count after the cursor."""
+        _, pagination = shard.get_all(cursor=None, limit=0, filter_fn=filter_fn)
+        total_items = pagination.total_items
+
+        def after_cursor_fn(item: T) -> bool:
+            return item.id > cursor and (filter_fn is None or filter_fn(item))  # type: ignore[operator]
+
+        # Shards hold items in insertion order, which isn't id order when writes commit out of
+        # order (e.g. ids allocated before the write pipeline queues them), so look at every match
+        matches, _ = shard.get_all(
+            cursor=None, limit=total_items, filter_fn=filter_fn if cursor is None else after_cursor_fn)
+        return heapq.nsmallest(limit, matches, key=lambda item: item.id), total_items, len(matches)
+
+    def existing_ids(self, item_ids: set[int]) -> set[int]:
+        return set().union(*self._executor.map(lambda shard: shard.existing_ids(item_ids), self._shards))
+
+    def get_by_id(self, item_id: int) -> Optional[T]:
+        for item in self._executor.map(lambda shard: shard.get_by_id(item_id), self._shards):
+            if item is not None:
+                return item
+        return None
+
+    def get_all_in_partition(self, partition_key: int, cursor: Optional[int], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None) -> tuple[list[T], PaginationResult]:
+        shard = self._shards[self._shard_index(partition_key)]
+        return shard.get_all_in_partition(partition_key, cursor=cursor, limit=limit, filter_fn=filter_fn)
+
+    def get_all_sorted(self, order_by: Ordering, after: Optional[str], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None, partition_key: Optional[int] = None) -> tuple[list[T], PaginationResult]:
+        if partition_key is not None:
+            shard = self._shards[self._shard_index(partition_key)]
+            return shard.get_all_sorted(order_by, after=after, limit=limit, filter_fn=filter_fn, partition_key=partition_key)
+
+        result_limit = limit if limit is not None else DEFAULT_LIMIT
+        pages = list(self._executor.map(
+            lambda shard: shard.get_all_sorted(order_by, after=after, limit=result_limit, filter_fn=filter_fn), self._shards))
+        return _merge_pages(pages, order_by, result_limit)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+Page = tuple[list[T], PaginationResult]
+
+
+def _filter_key(filter_fn: Optional[Callable[[Any], bool]]) -> Optional[Hashable]:
+    """
+        Key of a filter for the page cache, or None when its pages can't be cached.
+        Functions compare by identity, so a page found with a lambda could never be reused:
+        only value objects that define equality and hashing (e.g. frozen dataclasses) are cacheable.
+    """
+    if filter_fn is None:
+        return ()
+    if isinstance(filter_fn, (FunctionType, BuiltinFunctionType, MethodType, partial)):
+        return None
+    try:
+        hash(filter_fn)
+    except TypeError:
+        return None
+    return filter_fn
+
+
+# Caches records by id and pages by query in front of another datastore, e.g. a database
+class CachingDataStore(DataStore[T]):
+    """
+    Every item added to the backend, through this store or not, is written through to the
+    record cache and clears the cached pages, since it can change any page's items and totals.
+    Concurrent misses for the same record or page make a single backend call.
+    Cached pages are shared between callers and must not be modified.
+    """
+
+    def __init__(self, backend: DataStore[T], max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic) -> None:
+        super().__init__()
+        self._backend = backend
+        self._records = TTLCache[int, T](max_size, ttl, clock)
+        self._pages = TTLCache[Hashable, Page[T]](max_size, ttl, clock)
+        self._loads = SingleFlight[Hashable, Any]()
+        self.record_stats = CacheStats()
+        self.page_stats = CacheStats()
+        # Bumped by every add, so a page loaded before the add is not cached after it
+        self._generation = 0
+        self._lock = threading.Lock()
+        backend.changes.listen(self._write_through)
+
+    @property
+    def changes(self) -> ChangeFeed[T]:
+        return self._backend.changes
+
+    @property
+    def version(self) -> int:
+        return self._backend.version
+
+    # A replica backend catches up with other processes' adds first, which clears the cached pages
+    def refresh(self) -> None:
+        self._backend.refresh()
+
+    # The backend publishes each added item to its change feed, which writes it through
+    def add(self, item: T) -> T:
+        return self._backend.add(item)
+
+    def add_many(self, items: list[T]) -> list[T]:
+        return self._backend.add_many(items)
+
+    def add_idempotent(self, item: T, idempotency_key: str, request: object) -> T:
+        return self._backend.add_idempotent(item, idempotency_key, request)
+
+    def existing_ids(self, item_ids: set[int]) -> set[int]:
+        return self._backend.existing_ids(item_ids)
+
+    def _write_through(self, item: T) -> None:
+        with self._lock:
+            self._generation += 1
+            self._pages.clear()
+        self._records.set(item.id, item)
+
+    def get_by_id(self, item_id: int) -> Optional[T]:
+        self.refresh()
+        item = self._records.get(item_id)
+        self._count(self.record_stats, hit=item is not None)
+        if item is not None:
+            return item
+        return self._loads.do(("id", item_id), lambda: self._load_record(item_id))
+
+    def _load_record(self, item_id: int) -> Optional[T]:
+        # Items are never modified, so a record can be cached even if an add raced the load
+        item = self._backend.get_by_id(item_id)
+        if item is not None:
+            self._records.set(item_id, item)
+        return item
+
+    def get_all(self, cursor: Optional[int], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None) -> tuple[list[T], PaginationResult]:
+        return self._page(("all", cursor, limit), filter_fn,
+                          lambda: self._backend.get_all(cursor=cursor, limit=limit, filter_fn=filter_fn))
+
+    def get_all_in_partition(self, partition_key: int, cursor: Optional[int], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None) -> tuple[list[T], PaginationResult]:
+        return self._page(("partition", partition_key, cursor, limit), filter_fn,
+                          lambda: self._backend.get_all_in_partition(partition_key, cursor=cursor, limit=limit, filter_fn=filter_fn))
+
+    def get_all_sorted(self, order_by: Ordering, after: Optional[str], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None, partition_key: Optional[int] = None) -> tuple[list[T], PaginationResult]:
+        return self._page(("sorted", order_by, after, limit, partition_key), filter_fn,
+                          lambda: self._backend.get_all_sorted(order_by, after=after, limit=limit, filter_fn=filter_fn, partition_key=partition_key))
+
+    def _page(self, query: tuple[Hashable, ...], filter_fn: Optional[Callable[[T], bool]], load: Callable[[], Page[T]]) -> Page[T]:
+        self.refresh()
+        filter_key = _filter_key(filter_fn)
+        if filter_key is None:
+            self._count(self.page_stats, hit=False)
+            return load()
+
+        key = (*query, filter_key)
+        page = self._pages.get(key)
+        self._count(self.page_stats, hit=page is not None)
+        if page is not None:
+            return page
+        return self._loads.do(("page", key), lambda: self._load_page(key, load))
+
+    def _load_page(self, key: Hashable, load: Callable[[], Page[T]]) -> Page[T]:
+        generation = self._generation
+        page = load()
+        with self._lock:
+            if generation == self._generation:
+                self._pages.set(key, page)
+        return page
+
+    def _count(self, stats: CacheStats, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                stats.hits += 1
+            else:
+                stats.misses += 1
@@ -0,0 +1,72 @@
+"""
+Production entry point: `gunicorn` (run from this directory) picks this file up.
+
+Runs WEB_CONCURRENCY worker processes (default: one per core). A separate writer process
+owns the in-memory datastores and publishes every write to a shared-memory log that the
+workers replay into their own read replicas (see replica.py), so reads scale with cores and
+every worker sees the same loans and payments. Each worker holds a full copy of the data.
+Report jobs run in the worker that accepted them and are kept by the writer, so any worker
+can answer a poll.
+"""
+import multiprocessing
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+from typing import Any, Optional
+
+from conf import get_config
+from container import Container, payment_loan_id
+from replica import Replica, ReplicaJobStore, SharedCounter
+from seed import loan_payments
+
+wsgi_app = "app:app"
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+_log_name = f"loans_{secrets.token_hex(4)}"
+_address = os.path.join(tempfile.mkdtemp(), "writer.sock")
+_authkey = secrets.token_bytes(32)
+_payment_ids: Optional[SharedCounter] = None
+_writer: Optional[subprocess.Popen[str]] = None
+
+
+def on_starting(server: Any) -> None:
+    global _payment_ids, _writer
+    config = get_config()
+    if config.datastore_type != "in_memory":
+        raise ValueError(
+            "Shared-memory replicas are only used with DATASTORE_TYPE 'in_memory'.")
+
+    _payment_ids = SharedCounter(
+        max((payment.id for payment in loan_payments), default=0) + 1)
+    _writer = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(__file__), "replica.py"), _log_name, _address],
+        env={**os.environ, "REPLICA_AUTHKEY": _authkey.hex()},
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    assert _writer.stdout is not None
+    if _writer.stdout.readline().strip() != "ready":
+        raise RuntimeError("Datastore writer process did not start.")
+
+
+def post_fork(server: Any, worker: Any) -> None:
+    # Runs in each worker before the app is imported, so create_app() finds the container set up
+    replica = Replica(_log_name, _address, _authkey, kinds=["loan", "payment"],
+                      partition_keys={"payment": payment_loan_id})
+    Container.override(
+        loan_datastore=replica.store("loan"),
+        payment_datastore=replica.store("payment"),
+        payment_ids=_payment_ids,
+        # Unique to this server run and shared by its workers, like the data they replay
+        epoch=_log_name,
+        job_store=ReplicaJobStore(replica),
+    )
+
+
+def on_exit(server: Any) -> None:
+    if _writer is not None and _writer.poll() is None:
+        _writer.terminate()
+        _writer.wait()
@@ -0,0 +1,148 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+import enum
+import multiprocessing
+import threading
+from typing import Any, Callable, Optional, TypeVar
+import uuid
+
+DEFAULT_JOB_WORKERS = 2
+# Finished jobs kept for their results to be fetched; the oldest are forgotten first
+MAX_FINISHED_JOBS = 1000
+
+I = TypeVar("I")
+R = TypeVar("R")
+
+
+class JobStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class Job:
+    id: str
+    name: str
+    submitted_at: datetime
+    status: JobStatus = JobStatus.PENDING
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.SUCCEEDED, JobStatus.FAILED)
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status.value,
+            "submitted_at": self.submitted_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at is not None else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at is not None else None,
+            "error": self.error,
+        }
+
+
+class JobStore(ABC):
+    """Where jobs are kept while they run and after, for their status and results to be polled."""
+
+    @abstractmethod
+    def put(self, job: Job) -> None:
+        """Adds the job, or replaces it with a newer snapshot."""
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        pass
+
+
+class InMemoryJobStore(JobStore):
+    """Keeps the last `max_finished` finished jobs; the oldest are forgotten first."""
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS) -> None:
+        self._max_finished = max_finished
+        self._jobs: dict[str, Job] = {}
+        self._finished: deque[str] = deque()
+        self._lock = threading.Lock()
+
+    def put(self, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+            if job.finished:
+                self._finished.append(job.id)
+                while len(self._finished) > self._max_finished:
+                    del self._jobs[self._finished.popleft()]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+class JobRunner:
+    """
+    Runs jobs on a pool of `max_workers` threads, off the threads serving requests.
+
+    A job is a `collect` step (reading data, e.g. through LoanService) followed by a `compute`
+    step on what was collected. With `processes` > 0 the compute step runs in a process pool,
+    so CPU-bound jobs can use several cores instead of competing with requests for the GIL.
+    It must then be a top-level function of picklable data.
+
+    Jobs are kept in `store`, by default in memory. Runners in several processes can share a
+    store, so a job can be polled from any of them, whichever one runs it.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_JOB_WORKERS, processes: int = 0, max_finished: int = MAX_FINISHED_JOBS, store: Optional[JobStore] = None) -> None:
+        self._threads = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job")
+        # Spawned rather than forked: forking a process that runs threads can deadlock the child
+        self._processes: Optional[Executor] = ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("spawn")) if processes > 0 else None
+        # Jobs are immutable snapshots, replaced in the store as they progress
+        self._store = store if store is not None else InMemoryJobStore(max_finished)
+
+    def submit(self, name: str, collect: Callable[[], I], compute: Callable[[I], R]) -> Job:
+        job = Job(id=uuid.uuid4().hex, name=name, submitted_at=_now())
+        self._store.put(job)
+        self._threads.submit(self._run, job, collect, compute)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._store.get(job_id)
+
+    def _run(self, job: Job, collect: Callable[[], I], compute: Callable[[I], R]) -> None:
+        # Only this runner updates the job, so it can build each snapshot from the last one
+        job = self._update(job, status=JobStatus.RUNNING, started_at=_now())
+        try:
+            inputs = collect()
+            if self._processes is not None:
+                result = self._processes.submit(compute, inputs).result()
+            else:
+                result = compute(inputs)
+        except Exception as e:
+            self._update(job, status=JobStatus.FAILED,
+                         finished_at=_now(), error=str(e) or type(e).__name__)
+        else:
+            self._update(job, status=JobStatus.SUCCEEDED,
+                         finished_at=_now(), result=result)
+
+    def _update(self, job: Job, **changes: Any) -> Job:
+        job = replace(job, **changes)
+        self._store.put(job)
+        return job
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._threads.shutdown(wait=wait, cancel_futures=not wait)
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
@@ -0,0 +1,294 @@
+"""
+Load generator that replays a weighted traffic mix against a running server.
+
+Usage:
+    python loadtest.py --url http://localhost:5000 --clients 16 --duration 30
+    python loadtest.py --spawn --profile my_profile.json
+
+A profile is a JSON object of the form:
+    {
+        "operations": {"loans": 60, "loans_filtered": 20, "loan_payments": 15, "add_payment": 5},
+        "bursts": [{"operation": "add_payment", "every": 10.0, "size": 50}]
+    }
+where operation weights are relative, and each burst fires `size` extra requests of
+`operation` every `every` seconds. Runs with the same --seed replay the same sequence
+of requests per client.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import json
+import math
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Query shapes recorded from web/src/graphql/loan.ts
+LOANS_QUERY = """
+query Loans($cursor: Int, $limit: Int, $filter: LoanFilter) {
+    loans(cursor: $cursor, limit: $limit, filter: $filter) {
+        paginationParams { totalItems nextCursor }
+        items { id name interestRate principal dueDate }
+    }
+}
+"""
+
+LOAN_QUERY = """
+query Loan($loanId: Int!) {
+    loan(loanId: $loanId) { id name interestRate principal dueDate }
+}
+"""
+
+LOAN_PAYMENTS_QUERY = """
+query LoanPayments($loanId: Int!, $cursor: Int, $limit: Int) {
+    loanPayments(loanId: $loanId, cursor: $cursor, limit: $limit) {
+        items { id name interestRate principal dueDate status amount paymentDate }
+        paginationParams { totalItems nextCursor }
+    }
+}
+"""
+
+DEFAULT_PROFILE: dict[str, Any] = {
+    "operations": {
+        "loans": 60,
+        "loans_filtered": 20,
+        "loan": 5,
+        "loan_payments": 10,
+        "add_payment": 5,
+    },
+    "bursts": [{"operation": "add_payment", "every": 10.0, "size": 50}],
+}
+
+PAGE_SIZE = 10
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    body: dict[str, Any]
+
+
+@dataclass
+class Burst:
+    operation: str
+    every: float
+    size: int
+
+
+@dataclass
+class TrafficProfile:
+    operations: dict[str, float]
+    bursts: list[Burst] = field(default_factory=lambda: [])
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "TrafficProfile":
+        operations = {name: float(weight)
+                      for name, weight in data.get("operations", {}).items()}
+        bursts = [Burst(operation=burst["operation"], every=float(burst["every"]), size=int(burst["size"]))
+                  for burst in data.get("bursts", [])]
+        for name in list(operations) + [burst.operation for burst in bursts]:
+            if name not in OPERATIONS:
+                raise ValueError(
+                    f"Unknown operation: {name}. Must be one of {', '.join(OPERATIONS)}.")
+        if not operations or sum(operations.values()) <= 0:
+            raise ValueError("Profile must give at least one operation a positive weight.")
+        return cls(operations=operations, bursts=bursts)
+
+    def choose(self, rng: random.Random) -> str:
+        names = list(self.operations)
+        return rng.choices(names, weights=[self.operations[name] for name in names])[0]
+
+
+def _graphql(query: str, variables: dict[str, Any]) -> Request:
+    return Request("POST", "/graphql", {"query": query, "variables": variables})
+
+
+# Builds a request for each operation given a seeded RNG and the number of loans on the server
+OPERATIONS: dict[str, Callable[[random.Random, int], Request]] = {
+    "loans": lambda rng, loan_count: _graphql(
+        LOANS_QUERY, {"cursor": rng.choice([None, rng.randint(1, loan_count)]), "limit": PAGE_SIZE}),
+    "loans_filtered": lambda rng, loan_count: _graphql(
+        LOANS_QUERY, {"limit": PAGE_SIZE, "filter": {"principal": rng.choice([10_000.0, 50_000.0, 100_000.0])}}),
+    "loan": lambda rng, loan_count: _graphql(
+        LOAN_QUERY, {"loanId": rng.randint(1, loan_count)}),
+    "loan_payments": lambda rng, loan_count: _graphql(
+        LOAN_PAYMENTS_QUERY, {"loanId": rng.randint(1, loan_count), "limit": PAGE_SIZE}),
+    "add_payment": lambda rng, loan_count: Request(
+        "POST", "/payment", {"loan_id": rng.randint(1, loan_count), "amount": round(rng.uniform(100.0, 5_000.0), 2)}),
+}
+
+
+class Recorder:
+    """Thread-safe collection of latencies (seconds) and error counts per operation."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def record(self, operation: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(latency)
+            if not ok:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def send(base_url: str, request: Request, timeout: float = 30.0) -> bool:
+    http_request = urllib.request.Request(
+        base_url + request.path,
+        data=json.dumps(request.body).encode(),
+        headers={"Content-Type": "application/json"},
+        method=request.method,
+    )
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            payload = json.loads(response.read() or b"null")
+            # GraphQL reports resolver failures with a 200 and an "errors" key
+            return not (isinstance(payload, dict) and payload.get("errors"))
+    except (urllib.error.URLError, TimeoutError, ValueError):
+        return False
+
+
+def discover_loan_count(base_url: str) -> int:
+    request = urllib.request.Request(
+        base_url + "/graphql",
+        data=json.dumps({"query": LOANS_QUERY, "variables": {"limit": 0}}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        payload = json.loads(response.read())
+    total = payload["data"]["loans"]["paginationParams"]["totalItems"]
+    if total <= 0:
+        raise ValueError("Server has no loans to run against.")
+    return total
+
+
+def run_client(base_url: str, profile: TrafficProfile, loan_count: int, seed: int, deadline: float, recorder: Recorder) -> None:
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        operation = profile.choose(rng)
+        request = OPERATIONS[operation](rng, loan_count)
+        started = time.perf_counter()
+        ok = send(base_url, request)
+        recorder.record(operation, time.perf_counter() - started, ok)
+
+
+def run_bursts(base_url: str, profile: TrafficProfile, loan_count: int, seed: int, deadline: float, recorder: Recorder, pool: ThreadPoolExecutor) -> None:
+    rng = random.Random(seed)
+    next_fire = {index: time.monotonic() + burst.every for index,
+                 burst in enumerate(profile.bursts)}
+    while profile.bursts and time.monotonic() < deadline:
+        index, fire_at = min(next_fire.items(), key=lambda entry: entry[1])
+        time.sleep(max(0.0, min(fire_at, deadline) - time.monotonic()))
+        if time.monotonic() >= deadline:
+            break
+        burst = profile.bursts[index]
+        for _ in range(burst.size):
+            request = OPERATIONS[burst.operation](rng, loan_count)
+            pool.submit(_timed_send, base_url, burst.operation, request, recorder)
+        next_fire[index] = fire_at + burst.every
+
+
+def _timed_send(base_url: str, operation: str, request: Request, recorder: Recorder) -> None:
+    started = time.perf_counter()
+    ok = send(base_url, request)
+    recorder.record(operation, time.perf_counter() - started, ok)
+
+
+def report(recorder: Recorder, elapsed: float) -> str:
+    header = f"{'operation':<16}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    lines = [header, "-" * len(header)]
+    all_latencies: list[float] = []
+    total_errors = 0
+    for operation in sorted(recorder.latencies):
+        latencies = sorted(recorder.latencies[operation])
+        errors = recorder.errors.get(operation, 0)
+        all_latencies.extend(latencies)
+        total_errors += errors
+        lines.append(_report_line(operation, latencies, errors, elapsed))
+    lines.append("-" * len(header))
+    lines.append(_report_line("total", sorted(all_latencies), total_errors, elapsed))
+    return "\n".join(lines)
+
+
+def _report_line(name: str, latencies: list[float], errors: int, elapsed: float) -> str:
+    return (
+        f"{name:<16}{len(latencies):>10}{errors:>8}{len(latencies) / elapsed:>10.1f}"
+        f"{percentile(latencies, 50) * 1000:>10.2f}"
+        f"{percentile(latencies, 95) * 1000:>10.2f}"
+        f"{percentile(latencies, 99) * 1000:>10.2f}"
+    )
+
+
+def wait_for_server(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(base_url + "/", timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Server at {base_url} did not start within {timeout}s.")
+            time.sleep(0.2)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Replay a traffic mix against the loan API.")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--profile", help="Path to a JSON traffic profile (defaults to the built-in mix)")
+    parser.add_argument("--clients", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="Run time in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spawn", action="store_true", help="Start the Flask app on --url's port for the duration of the run")
+    args = parser.parse_args(argv)
+
+    profile_data = DEFAULT_PROFILE
+    if args.profile:
+        with open(args.profile) as profile_file:
+            profile_data = json.load(profile_file)
+    profile = TrafficProfile.from_dict(profile_data)
+    base_url = args.url.rstrip("/")
+
+    server: Optional[subprocess.Popen[bytes]] = None
+    if args.spawn:
+        # `flask run` without --debug, so there is no reloader child process to leak
+        port = urllib.parse.urlparse(base_url).port or 5000
+        server = subprocess.Popen(
+            [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port)])
+    try:
+        wait_for_server(base_url, timeout=30)
+        loan_count = discover_loan_count(base_url)
+        recorder = Recorder()
+        started = time.monotonic()
+        deadline = started + args.duration
+        with ThreadPoolExecutor(max_workers=args.clients) as clients, ThreadPoolExecutor(max_workers=args.clients) as burst_pool:
+            for index in range(args.clients):
+                clients.submit(run_client, base_url, profile,
+                               loan_count, args.seed + index, deadline, recorder)
+            run_bursts(base_url, profile, loan_count,
+                       args.seed - 1, deadline, recorder, burst_pool)
+        print(report(recorder, time.monotonic() - started))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Response compression and conditional GETs for the Flask app, plus conditional GETs for
+ASGI apps mounted next to it (Strawberry's /graphql under asgi.py).
+
+Compression applies to every response above COMPRESSION_MIN_SIZE bytes, using brotli when
+the client accepts it and a brotli module is installed, gzip otherwise.
+
+ETags are weak (they name the data a response was built from, not its bytes, so they hold
+for every encoding) and derived from a version string that changes whenever the data does.
+A GET whose If-None-Match still matches is answered with 304 before the view, and so the
+GraphQL resolvers, runs.
+"""
+import gzip
+import hashlib
+from typing import Any, Awaitable, Callable, Optional
+
+from flask import Flask, Response, g, request
+from werkzeug.http import parse_etags, quote_etag
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli  # type: ignore[no-redef]
+    except ImportError:
+        brotli = None  # type: ignore[assignment]
+
+# Smaller responses fit in a packet or two; compressing them costs more than it saves
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+# Brotli's faster qualities still beat gzip on JSON, the slow ones are meant for static assets
+BROTLI_QUALITY = 4
+
+
+def register_compression(app: Flask, min_size: int = COMPRESSION_MIN_SIZE) -> None:
+    @app.after_request
+    def compress(response: Response) -> Response:
+        return _compress(response, min_size)
+
+
+def _compress(response: Response, min_size: int) -> Response:
+    if (response.direct_passthrough or response.is_streamed or response.status_code < 200
+            or response.status_code in (204, 304) or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    # Checked before reading the body, so small responses are never buffered twice
+    if response.content_length is not None and response.content_length < min_size:
+        return response
+
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    encoding = request.accept_encodings.best_match(encodings)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(data, compresslevel=GZIP_LEVEL)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def register_conditional_gets(app: Flask, version: Callable[[], str], endpoints: set[str]) -> None:
+    """
+        Adds ETags to GET responses of `endpoints`, whose content must only depend on the request
+        and on `version`, and answers matching If-None-Match headers with 304.
+    """
+    @app.before_request
+    def check_etag() -> Optional[Response]:
+        if request.method != "GET" or request.endpoint not in endpoints:
+            return None
+        # Taken before the view runs: a write racing the view leaves an older tag, which only costs a refetch
+        etag = _etag(version(), request.full_path)
+        g.etag = etag
+        if request.if_none_match.contains_weak(etag):
+            not_modified = Response(status=304)
+            not_modified.set_etag(etag, weak=True)
+            return not_modified
+        return None
+
+    @app.after_request
+    def set_etag(response: Response) -> Response:
+        etag = g.pop("etag", None)
+        if etag is not None and response.status_code == 200:
+            response.set_etag(etag, weak=True)
+            # Let clients keep the response, but revalidate it before each use
+            response.headers.setdefault("Cache-Control", "no-cache")
+        return response
+
+
+class ConditionalGetMiddleware:
+    """
+        ASGI counterpart of register_conditional_gets, for an app whose GET responses only
+        depend on the request and on `version`. Tags match the Flask app's for the same URL.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]], version: Callable[[], str]) -> None:
+        self._app = app
+        self._version = version
+
+    async def __call__(self, scope: dict[str, Any], receive: Callable[..., Awaitable[Any]], send: Callable[..., Awaitable[None]]) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self._app(scope, receive, send)
+            return
+
+        full_path = f"{scope['path']}?{scope['query_string'].decode('latin-1')}"
+        etag = _etag(self._version(), full_path)
+        if_none_match = dict(scope["headers"]).get(b"if-none-match", b"").decode("latin-1")
+        if parse_etags(if_none_match).contains_weak(etag):
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [(b"etag", quote_etag(etag, weak=True).encode())]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_etag(message: dict[str, Any]) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = list(message.get("headers", []))
+                headers.append((b"etag", quote_etag(etag, weak=True).encode()))
+                if not any(name.lower() == b"cache-control" for name, _ in headers):
+                    headers.append((b"cache-control", b"no-cache"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self._app(scope, receive, send_with_etag)
+
+
+def _etag(version: str, full_path: str) -> str:
+    return hashlib.sha1(f"{version}\n{full_path}".encode()).hexdigest()[:20]
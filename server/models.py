@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 import enum
-from typing import Generic, Literal, Optional, TypeVar, List
+from typing import Generic, Literal, NamedTuple, Optional, TypeVar, List
 import strawberry
 import datetime
 
@@ -11,11 +11,18 @@ DataStoreType = Literal["in_memory", "database"]
 class Config:
     datastore_type: DataStoreType = "in_memory"  # or "database"
     database_url: Optional[str] = None
-
-
-@strawberry.type
-@dataclass
-class Loan:
+    payment_shards: int = 1
+    # Records and pages cached in front of each datastore; 0 disables the cache
+    cache_size: int = 0
+    cache_ttl: float = 30.0
+    # Threads running report jobs, and processes for their heavy part (0: run it in the threads)
+    job_workers: int = 2
+    job_processes: int = 0
+
+
+# Storage records used by the datastores: immutable tuples without a per-instance __dict__.
+# The GraphQL types further down have the same field names and resolve straight from them.
+class Loan(NamedTuple):
     id: int
     name: str
     interest_rate: float
@@ -32,14 +39,51 @@ class LoanFilter:
     due_date: Optional[datetime.date] = None
 
 
+@strawberry.enum
+class SortDirection(enum.Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+# Values are the names of the record fields to sort by
+@strawberry.enum
+class LoanSortField(enum.Enum):
+    ID = "id"
+    NAME = "name"
+    INTEREST_RATE = "interest_rate"
+    PRINCIPAL = "principal"
+    DUE_DATE = "due_date"
+
+
+@strawberry.enum
+class PaymentSortField(enum.Enum):
+    ID = "id"
+    PAYMENT_DATE = "payment_date"
+    AMOUNT = "amount"
+
+
+@strawberry.input
+@dataclass
+class LoanOrderBy:
+    field: LoanSortField
+    direction: SortDirection = SortDirection.ASC
+
+
+@strawberry.input
+@dataclass
+class PaymentOrderBy:
+    field: PaymentSortField
+    direction: SortDirection = SortDirection.ASC
+
+
+@strawberry.input
 @dataclass
 class LoanPaymentInput:
     loan_id: int
     amount: float
 
 
-@dataclass
-class LoanPayment:
+class LoanPayment(NamedTuple):
     id: int
     loan_id: int
     payment_date: datetime.date
@@ -62,9 +106,53 @@ class PaymentStatus(enum.Enum):
     DEFAULTED = "Defaulted"
 
 
-@strawberry.type
+class LoanPaymentResponse(NamedTuple):
+    """A payment with its status. Refers to its loan instead of copying the loan's fields."""
+    id: int
+    loan: Loan
+    status: PaymentStatus
+    amount: float
+    payment_date: Optional[datetime.date] = None
+
+    @property
+    def name(self) -> str:
+        return self.loan.name
+
+    @property
+    def interest_rate(self) -> float:
+        return self.loan.interest_rate
+
+    @property
+    def principal(self) -> float:
+        return self.loan.principal
+
+    @property
+    def due_date(self) -> datetime.date:
+        return self.loan.due_date
+
+
+@strawberry.type(name="Loan")
 @dataclass
-class LoanPaymentResponse:
+class LoanType:
+    id: int
+    name: str
+    interest_rate: float
+    principal: float
+    due_date: datetime.date
+
+
+@strawberry.type(name="LoanPayment")
+@dataclass
+class LoanPaymentType:
+    id: int
+    loan_id: int
+    payment_date: datetime.date
+    amount: float
+
+
+@strawberry.type(name="LoanPaymentResponse")
+@dataclass
+class LoanPaymentResponseType:
     id: int
     name: str
     interest_rate: float
@@ -74,11 +162,14 @@ class LoanPaymentResponse:
     amount: float
     payment_date: Optional[datetime.date] = None
 
+
 @strawberry.type
 @dataclass
 class PaginationResult:
     total_items: int
     next_cursor: Optional[int] = None
+    # Opaque cursor for the next page of a sorted query (pass it as `after`)
+    end_cursor: Optional[str] = None
 
 # Generic type variable for paginated results
 T = TypeVar("T")
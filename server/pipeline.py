@@ -0,0 +1,120 @@
+from itertools import count, groupby
+import threading
+import time
+from typing import Generic, Optional
+
+from datastore import DataStore, T
+
+DEFAULT_WINDOW_SECONDS = 0.002
+DEFAULT_MAX_BATCH = 256
+
+
+class _PendingWrite(Generic[T]):
+    def __init__(self, item: T, call: int) -> None:
+        self.item = item
+        # Writes from the same submit_many() call commit or fail together
+        self.call = call
+        self.result: Optional[T] = None
+        self.error: Optional[Exception] = None
+        self.done = False
+        self.promoted = False
+        self.wake = threading.Event()
+
+
+class WritePipeline(Generic[T]):
+    """
+    Group commit in front of a DataStore: concurrent writes are coalesced into one
+    add_many() call, while each caller still gets its own items back or its own error.
+    Each submit_many() call is all or nothing, even when it shares a batch with others.
+
+    The first writer to arrive becomes the leader. If the last batch was shared, it waits
+    `window` seconds for others to join; a writer that had the pipeline to itself commits
+    straight away. Either way it commits everything pending (up to `max_batch`). Writes
+    that arrive during a commit queue up, and the oldest of them leads the next batch
+    straight away. Only one batch commits at a time.
+    """
+
+    def __init__(self, datastore: DataStore[T], window: float = DEFAULT_WINDOW_SECONDS, max_batch: int = DEFAULT_MAX_BATCH) -> None:
+        self._datastore = datastore
+        self._window = window
+        self._max_batch = max_batch
+        self._pending: list[_PendingWrite[T]] = []
+        self._calls = count()
+        self._leader_active = False
+        # Whether the last batch had company, i.e. writes are arriving together and worth waiting for
+        self._contended = False
+        self._lock = threading.Lock()
+
+    def submit(self, item: T) -> T:
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items: list[T]) -> list[T]:
+        """Writes all the items, or none of them and raises the error that stopped them."""
+        with self._lock:
+            call = next(self._calls)
+            writes = [_PendingWrite[T](item, call) for item in items]
+            self._pending.extend(writes)
+            leader = not self._leader_active
+            self._leader_active = True
+            wait = self._window > 0 and self._contended
+
+        if leader:
+            if wait:
+                time.sleep(self._window)
+            self._lead()
+
+        for write in writes:
+            while not write.done:
+                write.wake.wait()
+                write.wake.clear()
+                if write.promoted and not write.done:
+                    self._lead()
+
+        for write in writes:
+            if write.error is not None:
+                raise write.error
+        return [write.result for write in writes]  # type: ignore[misc]
+
+    def _lead(self) -> None:
+        with self._lock:
+            end = min(self._max_batch, len(self._pending))
+            # A call's writes are queued together; never split them across batches
+            while end < len(self._pending) and self._pending[end].call == self._pending[end - 1].call:
+                end += 1
+            batch = self._pending[:end]
+            del self._pending[:end]
+
+        self._commit(batch)
+
+        with self._lock:
+            self._contended = len(batch) > 1 or bool(self._pending)
+            if self._pending:
+                # Hand over to the oldest waiting writer instead of leading forever
+                next_leader = self._pending[0]
+                next_leader.promoted = True
+                next_leader.wake.set()
+            else:
+                self._leader_active = False
+
+    def _commit(self, batch: list[_PendingWrite[T]]) -> None:
+        try:
+            results = self._datastore.add_many(
+                [write.item for write in batch])
+            for write, result in zip(batch, results):
+                write.result = result
+        except Exception:
+            # add_many is all-or-nothing; retry call by call so only the failing calls see an error
+            for _, call_writes in groupby(batch, key=lambda write: write.call):
+                writes = list(call_writes)
+                try:
+                    results = self._datastore.add_many(
+                        [write.item for write in writes])
+                    for write, result in zip(writes, results):
+                        write.result = result
+                except Exception as e:
+                    for write in writes:
+                        write.error = e
+
+        for write in batch:
+            write.done = True
+            write.wake.set()
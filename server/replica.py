@@ -0,0 +1,402 @@
+"""
+Shared-memory read replicas of the in-memory datastores, for multi-process serving.
+
+A single writer process owns the authoritative datastores. Every committed write is
+appended to an append-only log in `multiprocessing.shared_memory`, and each worker
+process replays the log into its own `InMemoryDataStore`s before serving a read, so all
+workers see the same data. Workers send writes to the writer over a
+`multiprocessing.connection` socket and wait for the commit.
+
+The writer also keeps the background job table. Jobs run in the worker that accepted them,
+which sends each snapshot of the job to the writer, so any worker can answer a poll.
+
+Shared memory only holds the replication log, not a read snapshot: Python objects can't
+be read in place from a shared segment, so every worker keeps its own copy of the
+records. Memory and start-up replay grow with the number of workers.
+
+Log layout:
+    header segment `<name>`:         committed length (u64) | data segment generation (u64)
+    data segment `<name>_<gen>`:     frame* where frame = length (u32) | pickled list of (kind, item)
+
+Bytes below the committed length are never rewritten, so readers need no lock. When the
+data segment fills up the writer copies it into a segment twice the size under the next
+generation, publishing the new generation before any length that needs it.
+"""
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+import multiprocessing.sharedctypes
+import os
+import pickle
+import signal
+import struct
+import sys
+import threading
+from typing import Any, Callable, Iterator, Optional, cast
+
+from cache import IdempotencyCache
+from datastore import DataStore, InMemoryDataStore, Ordering, T
+from jobs import InMemoryJobStore, Job, JobStore
+from models import PaginationResult
+from services import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS
+
+HEADER = struct.Struct("<QQ")
+FRAME_LENGTH = struct.Struct("<I")
+DEFAULT_CAPACITY = 1 << 20
+
+Record = tuple[str, Any]
+
+
+def _segment_name(name: str, generation: int) -> str:
+    return f"{name}_{generation}"
+
+
+def _attach(name: str) -> SharedMemory:
+    """
+    Attach to an existing segment without handing it to this process' resource tracker,
+    which would otherwise unlink it when a worker exits.
+    """
+    try:
+        return SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+    except TypeError:
+        # Python < 3.13 always registers the segment with the tracker
+        segment = SharedMemory(name=name)
+        resource_tracker.unregister(
+            getattr(segment, "_name"), "shared_memory")
+        return segment
+
+
+class SnapshotLog:
+    """Writer side of the shared-memory log. Not thread-safe; ReplicaWriter serializes access."""
+
+    def __init__(self, name: Optional[str] = None, capacity: int = DEFAULT_CAPACITY) -> None:
+        self._header = SharedMemory(name=name, create=True, size=HEADER.size)
+        self._generation = 0
+        self._length = 0
+        self._data = SharedMemory(
+            name=_segment_name(self.name, self._generation), create=True, size=capacity)
+        HEADER.pack_into(self._header.buf, 0, self._length, self._generation)
+
+    @property
+    def name(self) -> str:
+        return self._header.name
+
+    def append(self, records: list[Record]) -> int:
+        payload = pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)
+        frame_end = self._length + FRAME_LENGTH.size + len(payload)
+        if frame_end > self._data.size:
+            self._grow(frame_end)
+
+        FRAME_LENGTH.pack_into(self._data.buf, self._length, len(payload))
+        start = self._length + FRAME_LENGTH.size
+        self._data.buf[start:frame_end] = payload
+        # Publishing the length is what makes the frame visible to readers
+        self._length = frame_end
+        HEADER.pack_into(self._header.buf, 0, self._length, self._generation)
+        return self._length
+
+    def _grow(self, required: int) -> None:
+        capacity = self._data.size
+        while capacity < required:
+            capacity *= 2
+        generation = self._generation + 1
+        data = SharedMemory(name=_segment_name(
+            self.name, generation), create=True, size=capacity)
+        data.buf[:self._length] = self._data.buf[:self._length]
+        HEADER.pack_into(self._header.buf, 0, self._length, generation)
+
+        # Readers still attached to the old segment keep their mapping after the unlink
+        self._data.close()
+        self._data.unlink()
+        self._data = data
+        self._generation = generation
+
+    def close(self) -> None:
+        self._data.close()
+        self._data.unlink()
+        self._header.close()
+        self._header.unlink()
+
+
+class SnapshotReader:
+    """Reader side of the shared-memory log. Each call returns only records not yet read."""
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._header = _attach(name)
+        self._data: Optional[SharedMemory] = None
+        self._generation = -1
+        self._offset = 0
+
+    def read_new(self) -> list[Record]:
+        # Length before generation: any generation read afterwards holds at least `length` bytes
+        length, _ = HEADER.unpack_from(self._header.buf, 0)
+        if length == self._offset:
+            return []
+        _, generation = HEADER.unpack_from(self._header.buf, 0)
+        data = self._segment(generation)
+
+        records: list[Record] = []
+        while self._offset < length:
+            (size,) = FRAME_LENGTH.unpack_from(data.buf, self._offset)
+            start = self._offset + FRAME_LENGTH.size
+            records.extend(pickle.loads(data.buf[start:start + size]))
+            self._offset = start + size
+        return records
+
+    def _segment(self, generation: int) -> SharedMemory:
+        while self._data is None or generation != self._generation:
+            if self._data is not None:
+                self._data.close()
+                self._data = None
+            try:
+                self._data = _attach(_segment_name(self._name, generation))
+                self._generation = generation
+            except FileNotFoundError:
+                # The writer grew the log again between reading the header and attaching
+                _, generation = HEADER.unpack_from(self._header.buf, 0)
+        return self._data
+
+    def close(self) -> None:
+        if self._data is not None:
+            self._data.close()
+        self._header.close()
+
+
+class ReplicaWriter:
+    """
+    Owns the authoritative datastores and the shared-memory log.
+    Applies each write, then appends it to the log before acknowledging it.
+    Idempotency keys and jobs are kept here too, so any worker can answer a retry or a poll.
+    """
+
+    def __init__(self, log: SnapshotLog, stores: dict[str, DataStore[Any]]) -> None:
+        self._log = log
+        self._stores = stores
+        self._idempotent = IdempotencyCache[tuple[str, str], Any](
+            max_size=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL_SECONDS)
+        self._jobs = InMemoryJobStore()
+        self._lock = threading.Lock()
+        self._operations: dict[str, Callable[..., Any]] = {
+            "add": self.add, "add_many": self.add_many, "put_job": self._jobs.put, "get_job": self._jobs.get}
+
+    def publish_initial(self) -> None:
+        records: list[Record] = []
+        for kind, store in self._stores.items():
+            _, pagination = store.get_all(cursor=None, limit=0)
+            items, _ = store.get_all(
+                cursor=None, limit=pagination.total_items)
+            records.extend((kind, item) for item in items)
+        with self._lock:
+            self._log.append(records)
+
+    def add(self, kind: str, item: Any, idempotency_key: Optional[str] = None, request: object = None) -> Any:
+        if idempotency_key is None:
+            return self._add(kind, item)
+        return self._idempotent.run((kind, idempotency_key), request, lambda: self._add(kind, item))
+
+    def _add(self, kind: str, item: Any) -> Any:
+        with self._lock:
+            added = self._stores[kind].add(item)
+            self._log.append([(kind, added)])
+            return added
+
+    def add_many(self, kind: str, items: list[Any]) -> list[Any]:
+        """All or nothing, like DataStore.add_many; the batch is logged as one frame."""
+        with self._lock:
+            added = self._stores[kind].add_many(items)
+            self._log.append([(kind, item) for item in added])
+            return added
+
+    def serve_forever(self, listener: Listener) -> None:
+        while True:
+            try:
+                connection = listener.accept()
+            except OSError:
+                # Listener closed
+                return
+            threading.Thread(target=self._handle, args=(
+                connection,), daemon=True).start()
+
+    def _handle(self, connection: Connection) -> None:
+        with connection:
+            while True:
+                try:
+                    operation, args = connection.recv()
+                except EOFError:
+                    return
+                try:
+                    connection.send(("ok", self._operations[operation](*args)))
+                except ValueError as e:
+                    connection.send(("value_error", str(e)))
+                except Exception as e:
+                    connection.send(("error", str(e)))
+
+
+
+def run_writer(log_name: str, address: str, authkey: bytes, initial: dict[str, list[Any]], on_ready: Optional[Callable[[], None]] = None) -> None:
+    """Runs the writer until terminated. Calls `on_ready` once replicas can attach and connect."""
+    # Turn SIGTERM into SystemExit so the shared memory is unlinked on shutdown
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    log = SnapshotLog(name=log_name)
+    stores: dict[str, DataStore[Any]] = {
+        kind: InMemoryDataStore[Any](initial_items=list(items)) for kind, items in initial.items()}
+    writer = ReplicaWriter(log, stores)
+    writer.publish_initial()
+    try:
+        with Listener(address, authkey=authkey) as listener:
+            if on_ready is not None:
+                on_ready()
+            writer.serve_forever(listener)
+    finally:
+        log.close()
+
+
+class Replica:
+    """
+    A worker's read-optimized copy of the writer's datastores.
+    Reads catch up with the shared-memory log first; writes go to the writer.
+    """
+
+    def __init__(self, log_name: str, address: str, authkey: bytes, kinds: list[str], partition_keys: Optional[dict[str, Callable[[Any], int]]] = None) -> None:
+        self._reader = SnapshotReader(log_name)
+        self._address = address
+        self._authkey = authkey
+        self._connection: Optional[Connection] = None
+        # InMemoryDataStore reads straight from the list it is given, so the log can be
+        # replayed by appending to it, skipping the per-item uniqueness scan in add()
+        self._items: dict[str, list[Any]] = {kind: [] for kind in kinds}
+        partition_keys = partition_keys or {}
+        self._stores = {kind: InMemoryDataStore[Any](initial_items=items, partition_key=partition_keys.get(kind))
+                        for kind, items in self._items.items()}
+        self._replicas = {kind: ReplicaDataStore[Any](self, kind) for kind in kinds}
+        self._lock = threading.Lock()
+
+    def store(self, kind: str) -> "ReplicaDataStore[Any]":
+        return self._replicas[kind]
+
+    def local(self, kind: str) -> InMemoryDataStore[Any]:
+        return self._stores[kind]
+
+    def refresh(self) -> None:
+        with self._lock:
+            replayed = [(kind, item) for kind, item in self._reader.read_new()
+                        if kind in self._items]
+            for kind, item in replayed:
+                self._items[kind].append(item)
+        # Outside the lock, so listeners can read from the replica
+        for kind, item in replayed:
+            self._replicas[kind].changes.publish(item)
+
+    def add(self, kind: str, item: Any, idempotency_key: Optional[str] = None, request: object = None) -> Any:
+        return self._write("add", (kind, item, idempotency_key, request))
+
+    def add_many(self, kind: str, items: list[Any]) -> list[Any]:
+        # One round trip for the whole batch, which the writer applies all or nothing
+        return cast(list[Any], self._write("add_many", (kind, items)))
+
+    def put_job(self, job: Job) -> None:
+        self._call("put_job", (job,))
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        return cast(Optional[Job], self._call("get_job", (job_id,)))
+
+    def _write(self, operation: str, args: tuple[Any, ...]) -> Any:
+        result = self._call(operation, args)
+        # The writer acknowledges only after appending to the log, so this sees our write
+        self.refresh()
+        return result
+
+    def _call(self, operation: str, args: tuple[Any, ...]) -> Any:
+        with self._lock:
+            if self._connection is None:
+                self._connection = Client(self._address, authkey=self._authkey)
+            self._connection.send((operation, args))
+            status, result = self._connection.recv()
+        if status == "value_error":
+            raise ValueError(result)
+        if status != "ok":
+            raise RuntimeError(result)
+        return result
+
+
+class ReplicaDataStore(DataStore[T]):
+    """
+    Reads come from the worker's replica. Its change feed publishes writes from every
+    worker, as they are replayed from the log.
+    """
+
+    def __init__(self, replica: Replica, kind: str) -> None:
+        super().__init__()
+        self._replica = replica
+        self._kind = kind
+
+    def add(self, item: T) -> T:
+        return cast(T, self._replica.add(self._kind, item))
+
+    def add_many(self, items: list[T]) -> list[T]:
+        return cast(list[T], self._replica.add_many(self._kind, items))
+
+    def add_idempotent(self, item: T, idempotency_key: str, request: object) -> T:
+        return cast(T, self._replica.add(self._kind, item, idempotency_key, request))
+
+    def get_all(self, cursor: Optional[int], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None) -> tuple[list[T], PaginationResult]:
+        self._replica.refresh()
+        return self._replica.local(self._kind).get_all(cursor=cursor, limit=limit, filter_fn=filter_fn)
+
+    def get_by_id(self, item_id: int) -> Optional[T]:
+        self._replica.refresh()
+        return self._replica.local(self._kind).get_by_id(item_id)
+
+    @property
+    def version(self) -> int:
+        # Counts writes replayed from the log, so catch up with writes from other workers first
+        self.refresh()
+        return self.changes.version
+
+    def refresh(self) -> None:
+        self._replica.refresh()
+
+    def get_all_sorted(self, order_by: Ordering, after: Optional[str], limit: Optional[int], filter_fn: Optional[Callable[[T], bool]] = None, partition_key: Optional[int] = None) -> tuple[list[T], PaginationResult]:
+        # The local store indexes replayed items on its next sorted read
+        self._replica.refresh()
+        return self._replica.local(self._kind).get_all_sorted(order_by, after=after, limit=limit, filter_fn=filter_fn, partition_key=partition_key)
+
+
+class ReplicaJobStore(JobStore):
+    """Jobs kept by the writer, so a job accepted by one worker can be polled through any other."""
+
+    def __init__(self, replica: Replica) -> None:
+        self._replica = replica
+
+    def put(self, job: Job) -> None:
+        self._replica.put_job(job)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._replica.get_job(job_id)
+
+
+class SharedCounter(Iterator[int]):
+    """An id counter shared by forked worker processes."""
+
+    def __init__(self, start: int) -> None:
+        self._value = multiprocessing.sharedctypes.Value("q", start)
+
+    def __next__(self) -> int:
+        with self._value.get_lock():
+            value = self._value.value
+            self._value.value = value + 1
+        return value
+
+
+if __name__ == "__main__":
+    # Writer process: python replica.py <log name> <address>, with the hex authkey in REPLICA_AUTHKEY
+    from seed import loans, loan_payments
+
+    run_writer(
+        log_name=sys.argv[1],
+        address=sys.argv[2],
+        authkey=bytes.fromhex(os.environ["REPLICA_AUTHKEY"]),
+        initial={"loan": list(loans), "payment": list(loan_payments)},
+        on_ready=lambda: print("ready", flush=True),
+    )
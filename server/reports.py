@@ -0,0 +1,124 @@
+"""
+Portfolio-wide reports, run as background jobs (see jobs.py).
+
+Each report is split in three:
+    parse_params: validates the submitted parameters, in the request
+    collect:      reads what the report needs through LoanService, in a job thread
+    compute:      does the heavy work on what was collected. A top-level function of
+                  picklable data, so it can run in a worker process.
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+from jobs import Job, JobRunner
+from models import Loan, LoanPayment, PaymentStatus
+from services import LoanService
+from status_index import payment_status
+
+P = TypeVar("P")
+I = TypeVar("I")
+
+Portfolio = tuple[list[Loan], list[LoanPayment]]
+
+
+@dataclass(frozen=True)
+class Report(Generic[P, I]):
+    parse_params: Callable[[dict[str, Any]], P]
+    collect: Callable[[LoanService, P], I]
+    compute: Callable[[I], Any]
+
+
+def _no_params(params: dict[str, Any]) -> None:
+    if params:
+        raise ValueError(f"Unexpected parameters: {', '.join(sorted(params))}.")
+
+
+def _collect_portfolio(loan_service: LoanService, _: None) -> Portfolio:
+    return loan_service.get_portfolio()
+
+
+def payment_statuses(portfolio: Portfolio) -> dict[str, Any]:
+    """Number and total amount of payments per status, and the loans without any payment."""
+    loans, payments = portfolio
+    due_dates = {loan.id: loan.due_date for loan in loans}
+    by_status = {status.name: {"count": 0, "amount": 0.0}
+                 for status in PaymentStatus}
+    paid_loans: set[int] = set()
+    for payment in payments:
+        due_date = due_dates.get(payment.loan_id)
+        if due_date is None:
+            continue
+        paid_loans.add(payment.loan_id)
+        totals = by_status[payment_status(due_date, payment.payment_date).name]
+        totals["count"] += 1
+        totals["amount"] += payment.amount
+
+    for totals in by_status.values():
+        totals["amount"] = round(totals["amount"], 2)
+    return {
+        "payments": by_status,
+        "loans_without_payments": len(due_dates.keys() - paid_loans),
+    }
+
+
+def _parse_export_params(params: dict[str, Any]) -> Optional[PaymentStatus]:
+    status = params.get("status")
+    _no_params({name: value for name, value in params.items() if name != "status"})
+    if status is None:
+        return None
+    try:
+        return PaymentStatus[status]
+    except (KeyError, TypeError):
+        raise ValueError(
+            f"Invalid status: {status}. Must be one of {', '.join(status.name for status in PaymentStatus)}.")
+
+
+def _collect_export(loan_service: LoanService, status: Optional[PaymentStatus]) -> tuple[Portfolio, Optional[PaymentStatus]]:
+    return loan_service.get_portfolio(), status
+
+
+def payments_export(inputs: tuple[Portfolio, Optional[PaymentStatus]]) -> list[dict[str, Any]]:
+    """Every payment with its loan and status, optionally only those with one status."""
+    (loans, payments), only_status = inputs
+    loans_by_id = {loan.id: loan for loan in loans}
+    rows: list[dict[str, Any]] = []
+    for payment in payments:
+        loan = loans_by_id.get(payment.loan_id)
+        if loan is None:
+            continue
+        status = payment_status(loan.due_date, payment.payment_date)
+        if only_status is not None and status != only_status:
+            continue
+        rows.append({
+            "id": payment.id,
+            "loan_id": loan.id,
+            "loan_name": loan.name,
+            "due_date": loan.due_date.isoformat(),
+            "payment_date": payment.payment_date.isoformat() if payment.payment_date is not None else None,
+            "amount": payment.amount,
+            "status": status.name,
+        })
+    return rows
+
+
+REPORTS: dict[str, Report[Any, Any]] = {
+    "payment_statuses": Report(parse_params=_no_params, collect=_collect_portfolio, compute=payment_statuses),
+    "payments_export": Report(parse_params=_parse_export_params, collect=_collect_export, compute=payments_export),
+}
+
+
+def submit_report(job_runner: JobRunner, loan_service: LoanService, payload: Any) -> Job:
+    """Validates a report request, {"report": <name>, "params": {...}}, and queues it."""
+    if not isinstance(payload, dict):
+        raise ValueError("Request body must be a JSON object.")
+    name = payload.get("report")
+    report = REPORTS.get(name) if isinstance(name, str) else None
+    if report is None:
+        raise ValueError(
+            f"Unknown report: {name}. Must be one of {', '.join(REPORTS)}.")
+    params = payload.get("params") or {}
+    if not isinstance(params, dict):
+        raise ValueError("params must be a JSON object.")
+
+    parsed = report.parse_params(params)
+    return job_runner.submit(name, lambda: report.collect(loan_service, parsed), report.compute)
@@ -3,6 +3,11 @@ import strawberry
 from strawberry.flask.views import GraphQLView
 
 from container import Container
+from jobs import JobStatus
+from reports import submit_report
+
+# GET endpoints whose responses only depend on the request and the data, so they can carry ETags
+CACHEABLE_ENDPOINTS = {"home", "graphql_view"}
 
 
 def home():
@@ -15,7 +20,8 @@ def add_loan_payment():
         loan_service = Container.loan_service()
         loan_payment_input = loan_service.validate_and_format_loan_payment_request(
             payload)
-        payment = loan_service.add_loan_payment(loan_payment_input)
+        payment = loan_service.add_loan_payment(
+            loan_payment_input, idempotency_key=request.headers.get("Idempotency-Key"))
         return payment.to_dict(), 201
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
@@ -23,9 +29,41 @@ def add_loan_payment():
         return jsonify({"error": str(e)}), 500
 
 
+def submit_report_job():
+    try:
+        job = submit_report(Container.job_runner(),
+                            Container.loan_service(), request.get_json(silent=True))
+        return job.to_dict(), 202, {"Location": f"/reports/{job.id}"}
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def get_report_job(job_id: str):
+    job = Container.job_runner().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Report {job_id} does not exist."}), 404
+    return job.to_dict()
+
+
+def get_report_result(job_id: str):
+    job = Container.job_runner().get(job_id)
+    if job is None:
+        return jsonify({"error": f"Report {job_id} does not exist."}), 404
+    if job.status == JobStatus.FAILED:
+        return jsonify({"error": job.error}), 500
+    if job.status != JobStatus.SUCCEEDED:
+        return jsonify({"error": f"Report {job_id} is {job.status.value}."}), 409
+    return jsonify({"result": job.result})
+
+
 def register_routes(app: Flask, schema: strawberry.Schema):
     app.add_url_rule("/", view_func=home)
     app.add_url_rule("/payment", view_func=add_loan_payment, methods=["POST"])
+    app.add_url_rule("/reports", view_func=submit_report_job, methods=["POST"])
+    app.add_url_rule("/reports/<job_id>", view_func=get_report_job)
+    app.add_url_rule("/reports/<job_id>/result", view_func=get_report_result)
     app.add_url_rule(
         "/graphql",
         view_func=GraphQLView.as_view(
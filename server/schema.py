@@ -1,31 +1,71 @@
-from typing import Optional
+import datetime
+from typing import AsyncGenerator, List, Optional, cast
 import strawberry
 
-from models import Loan, LoanFilter, LoanPaymentResponse, PaginatedResult
+from models import LoanFilter, LoanOrderBy, LoanPaymentInput, LoanPaymentResponseType, LoanPaymentType, LoanType, PaginatedResult, PaymentOrderBy, PaymentStatus
 from container import Container
 
+# Resolvers return the datastore records as they are: Strawberry reads each selected
+# field off them by name, so no GraphQL objects are built per record.
 
 @strawberry.type
 class Query:
 
     @strawberry.field
-    def loans(self, cursor: Optional[int] = None, limit: Optional[int] = None, filter: Optional[LoanFilter] = None) -> PaginatedResult[Loan]:
+    def loans(self, cursor: Optional[int] = None, limit: Optional[int] = None, filter: Optional[LoanFilter] = None, order_by: Optional[List[LoanOrderBy]] = None, after: Optional[str] = None) -> PaginatedResult[LoanType]:
         loan_service = Container.loan_service()
         items, pagination_params = loan_service.get_loans(
-            cursor, limit, filter)
-        return PaginatedResult[Loan](items=items, pagination_params=pagination_params)
+            cursor, limit, filter, order_by=order_by, after=after)
+        return PaginatedResult[LoanType](items=cast(List[LoanType], items), pagination_params=pagination_params)
 
     @strawberry.field
-    def loan(self, loan_id: int) -> Optional[Loan]:
+    def loan(self, loan_id: int) -> Optional[LoanType]:
         loan_service = Container.loan_service()
-        return loan_service.get_loan_by_id(loan_id)
+        return cast(Optional[LoanType], loan_service.get_loan_by_id(loan_id))
 
     @strawberry.field
-    def loan_payments(self, loan_id: int, cursor: Optional[int] = None, limit: Optional[int] = None) -> PaginatedResult[LoanPaymentResponse]:
+    def loan_payments(self, loan_id: int, cursor: Optional[int] = None, limit: Optional[int] = None, order_by: Optional[List[PaymentOrderBy]] = None, after: Optional[str] = None) -> PaginatedResult[LoanPaymentResponseType]:
         loan_service = Container.loan_service()
         items, pagination_params = loan_service.get_loan_payments(
-            loan_id, cursor, limit)
-        return PaginatedResult[LoanPaymentResponse](items=items, pagination_params=pagination_params)
+            loan_id, cursor, limit, order_by=order_by, after=after)
+        return PaginatedResult[LoanPaymentResponseType](items=cast(List[LoanPaymentResponseType], items), pagination_params=pagination_params)
+
+    @strawberry.field
+    def overdue_loans(self, status: PaymentStatus, as_of: Optional[datetime.date] = None) -> List[LoanType]:
+        loan_service = Container.loan_service()
+        return cast(List[LoanType], loan_service.get_loans_with_status(status, as_of))
+
+
+@strawberry.type
+class Mutation:
+
+    @strawberry.mutation
+    def add_loan_payment(self, loan_id: int, amount: float, idempotency_key: Optional[str] = None) -> LoanPaymentType:
+        loan_service = Container.loan_service()
+        loan_payment_input = loan_service.validate_and_format_loan_payment_request(
+            {"loan_id": loan_id, "amount": amount})
+        return cast(LoanPaymentType, loan_service.add_loan_payment(loan_payment_input, idempotency_key=idempotency_key))
+
+    @strawberry.mutation
+    def add_loan_payments(self, inputs: List[LoanPaymentInput]) -> List[LoanPaymentType]:
+        loan_service = Container.loan_service()
+        loan_payment_inputs = [
+            loan_service.validate_and_format_loan_payment_request(
+                {"loan_id": input.loan_id, "amount": input.amount})
+            for input in inputs
+        ]
+        return cast(List[LoanPaymentType], loan_service.add_loan_payments(loan_payment_inputs))
+
+
+@strawberry.type
+class Subscription:
+
+    @strawberry.subscription
+    async def payment_added(self, loan_id: int) -> AsyncGenerator[LoanPaymentResponseType, None]:
+        loan_service = Container.loan_service()
+        async for payment in loan_service.payments_added(loan_id):
+            yield cast(LoanPaymentResponseType, payment)
 
 
-schema = strawberry.Schema(query=Query)
+schema = strawberry.Schema(
+    query=Query, mutation=Mutation, subscription=Subscription)
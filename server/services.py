@@ -1,92 +1,165 @@
+from dataclasses import dataclass
 from datetime import date
 from itertools import count
-from typing import Any, List, Optional
-from models import Loan, LoanFilter, LoanPayment, LoanPaymentInput, LoanPaymentResponse, PaginationResult, PaymentStatus
-from datastore import DataStore
+import threading
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence, Union
+from models import Loan, LoanFilter, LoanOrderBy, LoanPayment, LoanPaymentInput, LoanPaymentResponse, PaginationResult, PaymentOrderBy, PaymentStatus, SortDirection
+from datastore import DataStore, Ordering, SortKey, all_items
+from cache import IdempotencyCache
+from pipeline import WritePipeline
+from status_index import StatusIndex, payment_status
+
+# Responses to idempotent payment requests are kept for a day, up to this many keys
+IDEMPOTENCY_CACHE_SIZE = 10_000
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+SORTED_CURSOR_ERROR = "Sorted results are paged with after, not cursor."
+
+
+# Filters are value objects rather than closures, so that caching datastores can key pages by them
+@dataclass(frozen=True)
+class LoanFilterFn:
+    name: Optional[str] = None
+    interest_rate: Optional[float] = None
+    principal: Optional[float] = None
+    due_date: Optional[date] = None
+
+    @classmethod
+    def from_filter(cls, filter: LoanFilter) -> "LoanFilterFn":
+        return cls(
+            name=filter.name.lower() if filter.name is not None else None,
+            interest_rate=filter.interest_rate,
+            principal=filter.principal,
+            due_date=filter.due_date,
+        )
+
+    def __call__(self, loan: Loan) -> bool:
+        if self.name is not None and self.name not in loan.name.lower():
+            return False
+        if self.interest_rate is not None and loan.interest_rate > self.interest_rate:
+            return False
+        if self.principal is not None and loan.principal > self.principal:
+            return False
+        if self.due_date is not None and loan.due_date > self.due_date:
+            return False
+        return True
+
+
+@dataclass(frozen=True)
+class PaymentOfLoan:
+    loan_id: int
+
+    def __call__(self, payment: LoanPayment) -> bool:
+        return payment.loan_id == self.loan_id
 
 
 class LoanService:
     _id_counter = count(4)
 
-    def __init__(self, loan_data: DataStore[Loan], loan_payment_data: DataStore[LoanPayment]) -> None:
+    def __init__(self, loan_data: DataStore[Loan], loan_payment_data: DataStore[LoanPayment], payment_ids: Optional[Iterator[int]] = None) -> None:
         self._loan_data = loan_data
         self._loan_payment_data = loan_payment_data
+        # Multi-process deployments pass a counter shared by all workers
+        if payment_ids is not None:
+            self._id_counter = payment_ids
+        self._idempotent_payments = IdempotencyCache[str, LoanPayment](
+            max_size=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL_SECONDS)
+        # Concurrent payments are written to the datastore in batches
+        self._payment_writes = WritePipeline[LoanPayment](loan_payment_data)
+        self._status_index: Optional[StatusIndex] = None
+        self._status_index_lock = threading.Lock()
 
     def get_loans(
         self,
         cursor: Optional[int],
         limit: Optional[int],
         filter: Optional[LoanFilter],
+        order_by: Optional[List[LoanOrderBy]] = None,
+        after: Optional[str] = None,
     ) -> tuple[List[Loan], PaginationResult]:
-        def filter_fn(loan: Loan) -> bool:
-            if filter is None:
-                return True
-            if filter.name is not None and filter.name.lower() not in loan.name.lower():
-                return False
-            if filter.interest_rate is not None and loan.interest_rate > filter.interest_rate:
-                return False
-            if filter.principal is not None and loan.principal > filter.principal:
-                return False
-            if filter.due_date is not None and loan.due_date > filter.due_date:
-                return False
-            return True
-
-        return self._loan_data.get_all(cursor=cursor, limit=limit, filter_fn=filter_fn)
+        """
+            Loans in insertion order, paged by `cursor` (the last loan's id). Passing `order_by`
+            sorts them instead, paged by `after` (the previous page's end_cursor).
+        """
+        filter_fn = LoanFilterFn.from_filter(filter) if filter is not None else None
+        if order_by is None and after is None:
+            return self._loan_data.get_all(cursor=cursor, limit=limit, filter_fn=filter_fn)
+
+        if cursor is not None:
+            raise ValueError(SORTED_CURSOR_ERROR)
+        return self._loan_data.get_all_sorted(
+            _ordering(order_by), after=after, limit=limit, filter_fn=filter_fn)
 
     def get_loan_by_id(self, loan_id: int) -> Optional[Loan]:
         return self._loan_data.get_by_id(loan_id)
 
-    def get_loan_payments(self, loan_id: int, cursor: Optional[int] = None, limit: Optional[int] = None) -> tuple[List[LoanPaymentResponse], PaginationResult]:
+    def get_loan_payments(self, loan_id: int, cursor: Optional[int] = None, limit: Optional[int] = None, order_by: Optional[List[PaymentOrderBy]] = None, after: Optional[str] = None) -> tuple[List[LoanPaymentResponse], PaginationResult]:
         loan = self.get_loan_by_id(loan_id)
         if loan is None:
             return [], PaginationResult(total_items=0)
 
-        def filter_fn(payment: LoanPayment) -> bool:
-            return payment.loan_id == loan_id
-
-        payments, pagination_result = self._loan_payment_data.get_all(
-            cursor=cursor, limit=limit, filter_fn=filter_fn)
+        filter_fn = PaymentOfLoan(loan_id)
+        if order_by is None and after is None:
+            payments, pagination_result = self._loan_payment_data.get_all_in_partition(
+                loan_id, cursor=cursor, limit=limit, filter_fn=filter_fn)
+        elif cursor is not None:
+            raise ValueError(SORTED_CURSOR_ERROR)
+        else:
+            payments, pagination_result = self._loan_payment_data.get_all_sorted(
+                _ordering(order_by), after=after, limit=limit, filter_fn=filter_fn, partition_key=loan_id)
 
         if len(payments) == 0:
             return [
                 LoanPaymentResponse(
                     id=-1,
-                    name=loan.name,
-                    interest_rate=loan.interest_rate,
-                    principal=loan.principal,
-                    due_date=loan.due_date,
+                    loan=loan,
                     payment_date=None,
                     status=PaymentStatus.UNPAID,
                     amount=0.0
                 )
             ], pagination_result
 
-        return [
-            LoanPaymentResponse(
-                id=payment.id,
-                name=loan.name,
-                interest_rate=loan.interest_rate,
-                principal=loan.principal,
-                due_date=loan.due_date,
-                payment_date=payment.payment_date,
-                status=self._get_loan_payment_status(
-                    loan.due_date, payment.payment_date),
-                amount=payment.amount
-            )
-            for payment in payments
-        ], pagination_result
+        return [self._to_loan_payment_response(loan, payment) for payment in payments], pagination_result
+
+    async def payments_added(self, loan_id: int) -> AsyncIterator[LoanPaymentResponse]:
+        """Yields each payment added to the loan from now on."""
+        loan = self.get_loan_by_id(loan_id)
+        if loan is None:
+            raise ValueError(f"Loan with id {loan_id} does not exist.")
+
+        with self._loan_payment_data.changes.subscribe(filter_fn=lambda payment: payment.loan_id == loan_id) as payments:
+            async for payment in payments:
+                yield self._to_loan_payment_response(loan, payment)
+
+    def _to_loan_payment_response(self, loan: Loan, payment: LoanPayment) -> LoanPaymentResponse:
+        return LoanPaymentResponse(
+            id=payment.id,
+            loan=loan,
+            payment_date=payment.payment_date,
+            status=self._get_loan_payment_status(
+                loan.due_date, payment.payment_date),
+            amount=payment.amount
+        )
+
+    def get_portfolio(self) -> tuple[List[Loan], List[LoanPayment]]:
+        """Every loan and every payment, for portfolio-wide reports."""
+        return all_items(self._loan_data), all_items(self._loan_payment_data)
+
+    def get_loans_with_status(self, status: PaymentStatus, as_of: Optional[date] = None) -> List[Loan]:
+        """Loans whose status is `status` on `as_of` (default: today), e.g. every loan defaulted by then."""
+        return self._get_status_index().loans_with_status(status, as_of or date.today())
+
+    def _get_status_index(self) -> StatusIndex:
+        # Built on first use, then kept up to date by the datastores' change feeds
+        with self._status_index_lock:
+            if self._status_index is None:
+                self._status_index = StatusIndex(
+                    self._loan_data, self._loan_payment_data)
+            return self._status_index
 
     def _get_loan_payment_status(self, loan_due_date: date, payment_date: Optional[date]) -> PaymentStatus:
-        if payment_date is None:
-            return PaymentStatus.UNPAID
-
-        days_late = (payment_date - loan_due_date).days
-        if days_late <= 5:
-            return PaymentStatus.ON_TIME
-        elif 6 <= days_late <= 30:
-            return PaymentStatus.LATE
-        else:
-            return PaymentStatus.DEFAULTED
+        return payment_status(loan_due_date, payment_date)
 
     def validate_and_format_loan_payment_request(self, input: dict[str, Any]) -> LoanPaymentInput:
         loan_id = input.get("loan_id")
@@ -100,16 +173,42 @@ class LoanService:
 
         return LoanPaymentInput(loan_id=loan_id, amount=float(amount))
 
-    def add_loan_payment(self, input: LoanPaymentInput) -> LoanPayment:
+    def add_loan_payment(self, input: LoanPaymentInput, idempotency_key: Optional[str] = None) -> LoanPayment:
+        """
+            Adds a payment. Retries carrying the same idempotency key get the first payment back,
+            and concurrent duplicates are inserted only once, whichever process they reach.
+        """
+        if idempotency_key is None:
+            return self._add_loan_payment(input)
+
+        if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise ValueError(
+                f"Idempotency key must be between 1 and {MAX_IDEMPOTENCY_KEY_LENGTH} characters.")
+        # Retries to this process are answered here; the datastore dedupes those that reach other processes
+        return self._idempotent_payments.run(idempotency_key, input, lambda: self._loan_payment_data.add_idempotent(
+            self._new_loan_payment(input), idempotency_key, input))
+
+    def add_loan_payments(self, inputs: List[LoanPaymentInput]) -> List[LoanPayment]:
+        """Adds several payments, all or none: every loan is checked first, then the payments are written together."""
+        payments = [self._new_loan_payment(input) for input in inputs]
+        return self._payment_writes.submit_many(payments)
+
+    def _add_loan_payment(self, input: LoanPaymentInput) -> LoanPayment:
+        return self._payment_writes.submit(self._new_loan_payment(input))
+
+    def _new_loan_payment(self, input: LoanPaymentInput) -> LoanPayment:
         loan = self.get_loan_by_id(input.loan_id)
         if loan is None:
             raise ValueError(f"Loan with id {input.loan_id} does not exist.")
 
-        loan_payment = LoanPayment(
+        return LoanPayment(
             id=next(self._id_counter),
             loan_id=input.loan_id,
             payment_date=date.today(),
             amount=input.amount
         )
 
-        return self._loan_payment_data.add(loan_payment)
+
+def _ordering(order_by: Optional[Sequence[Union[LoanOrderBy, PaymentOrderBy]]]) -> Ordering:
+    return tuple(SortKey(order.field.value, descending=order.direction == SortDirection.DESC)
+                 for order in order_by or [])
@@ -0,0 +1,144 @@
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+import heapq
+import threading
+from typing import Optional
+
+from datastore import DataStore, all_items
+from models import Loan, LoanPayment, PaymentStatus
+
+# Payments up to this many days after the due date are on time
+ON_TIME_DAYS = 5
+# Payments more than this many days after the due date mean the loan defaulted
+LATE_DAYS = 30
+
+
+def payment_status(due_date: date, payment_date: Optional[date]) -> PaymentStatus:
+    if payment_date is None:
+        return PaymentStatus.UNPAID
+
+    days_late = (payment_date - due_date).days
+    if days_late <= ON_TIME_DAYS:
+        return PaymentStatus.ON_TIME
+    elif days_late <= LATE_DAYS:
+        return PaymentStatus.LATE
+    else:
+        return PaymentStatus.DEFAULTED
+
+
+class StatusIndex:
+    """
+    Buckets loans by payment status as of any date.
+
+    A paid loan's status is fixed by its first payment, from the day it was made. Loans
+    without payments are kept sorted by due date, so for a given date the late and
+    defaulted ones are the ranges before `as_of - ON_TIME_DAYS` and `as_of - LATE_DAYS`: a
+    lookup costs two bisections plus the size of the answer, and nothing needs updating as
+    time passes. Loans first paid after `as_of` were still unpaid then, and are placed by
+    due date at lookup; for today that's none of them. Kept up to date through the
+    datastores' change feeds.
+    """
+
+    def __init__(self, loan_data: DataStore[Loan], loan_payment_data: DataStore[LoanPayment]) -> None:
+        self._loans: dict[int, Loan] = {}
+        self._first_payment: dict[int, date] = {}
+        # Sorted (due date, loan id) of loans without payments
+        self._unpaid: list[tuple[date, int]] = []
+        # Sorted (first payment date, loan id) of paid loans, per status and all together
+        self._paid: dict[PaymentStatus, list[tuple[date, int]]] = {
+            status: [] for status in PaymentStatus if status != PaymentStatus.UNPAID}
+        self._paid_dates: list[tuple[date, int]] = []
+        # Reentrant: loading from a replica can publish the replayed writes to our listeners
+        self._lock = threading.RLock()
+
+        # Listen before loading, so writes made during the load aren't missed; both paths are idempotent
+        loan_data.changes.listen(self.add_loan)
+        loan_payment_data.changes.listen(self.add_payment)
+        with self._lock:
+            for loan in all_items(loan_data):
+                self._add_loan(loan)
+            for payment in all_items(loan_payment_data):
+                self._add_payment(payment)
+
+    def loans_with_status(self, status: PaymentStatus, as_of: date) -> list[Loan]:
+        on_time_since = as_of - timedelta(days=ON_TIME_DAYS)
+        late_since = as_of - timedelta(days=LATE_DAYS)
+        with self._lock:
+            if status == PaymentStatus.UNPAID:
+                entries = self._unpaid_on(as_of, on_time_since, None)
+            elif status == PaymentStatus.LATE:
+                entries = self._unpaid_on(as_of, late_since, on_time_since) + self._paid_by(status, as_of)
+            elif status == PaymentStatus.DEFAULTED:
+                entries = self._unpaid_on(as_of, None, late_since) + self._paid_by(status, as_of)
+            else:
+                entries = self._paid_by(status, as_of)
+            return [self._loans[loan_id] for _, loan_id in entries]
+
+    def _unpaid_on(self, as_of: date, due_from: Optional[date], due_before: Optional[date]) -> list[tuple[date, int]]:
+        """Sorted (due date, loan id) of loans unpaid on `as_of` that fell due in [due_from, due_before)."""
+        start = 0 if due_from is None else bisect_left(self._unpaid, (due_from,))
+        end = len(self._unpaid) if due_before is None else bisect_left(self._unpaid, (due_before,))
+        paid_later: list[tuple[date, int]] = []
+        for _, loan_id in self._paid_dates[_after(self._paid_dates, as_of):]:
+            due_date = self._loans[loan_id].due_date
+            if (due_from is None or due_date >= due_from) and (due_before is None or due_date < due_before):
+                paid_later.append((due_date, loan_id))
+        return list(heapq.merge(self._unpaid[start:end], sorted(paid_later)))
+
+    def _paid_by(self, status: PaymentStatus, as_of: date) -> list[tuple[date, int]]:
+        paid = self._paid[status]
+        return paid[:_after(paid, as_of)]
+
+    def add_loan(self, loan: Loan) -> None:
+        with self._lock:
+            self._add_loan(loan)
+
+    def add_payment(self, payment: LoanPayment) -> None:
+        with self._lock:
+            self._add_payment(payment)
+
+    def _add_loan(self, loan: Loan) -> None:
+        if loan.id in self._loans:
+            return
+        self._loans[loan.id] = loan
+        first_payment = self._first_payment.get(loan.id)
+        if first_payment is None:
+            insort(self._unpaid, (loan.due_date, loan.id))
+        else:
+            self._insert_paid(loan, first_payment)
+
+    def _add_payment(self, payment: LoanPayment) -> None:
+        if payment.payment_date is None:
+            return
+        previous = self._first_payment.get(payment.loan_id)
+        if previous is not None and previous <= payment.payment_date:
+            return
+        self._first_payment[payment.loan_id] = payment.payment_date
+
+        loan = self._loans.get(payment.loan_id)
+        if loan is None:
+            # Placed when the loan itself is added
+            return
+        if previous is None:
+            _remove(self._unpaid, (loan.due_date, loan.id))
+        else:
+            _remove(self._paid[payment_status(
+                loan.due_date, previous)], (previous, loan.id))
+            _remove(self._paid_dates, (previous, loan.id))
+        self._insert_paid(loan, payment.payment_date)
+
+    def _insert_paid(self, loan: Loan, payment_date: date) -> None:
+        insort(self._paid[payment_status(loan.due_date, payment_date)],
+               (payment_date, loan.id))
+        insort(self._paid_dates, (payment_date, loan.id))
+
+
+def _after(entries: list[tuple[date, int]], day: date) -> int:
+    """Index of the first entry dated after `day`."""
+    return bisect_left(entries, (day + timedelta(days=1),))
+
+
+def _remove(entries: list[tuple[date, int]], entry: tuple[date, int]) -> None:
+    index = bisect_left(entries, entry)
+    if index < len(entries) and entries[index] == entry:
+        del entries[index]
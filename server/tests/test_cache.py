@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+import pytest
+
+from cache import IdempotencyCache, SingleFlight, TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTTLCache:
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache[str, int](max_size=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        cache = TTLCache[str, int](max_size=2, ttl=10, clock=clock)
+        cache.set("a", 1)
+        clock.now = 9.9
+        assert cache.get("a") == 1
+        clock.now = 10.0
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_run_once(self):
+        flight = SingleFlight[str, int]()
+        release = threading.Event()
+        calls: list[int] = []
+
+        def slow() -> int:
+            calls.append(1)
+            release.wait()
+            return 42
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(flight.do, "key", slow) for _ in range(5)]
+            # Wait until the leader is running before letting it finish
+            while not calls:
+                pass
+            release.set()
+            assert [future.result() for future in futures] == [42] * 5
+        assert len(calls) == 1
+
+
+class TestIdempotencyCache:
+    def test_returns_first_response(self):
+        cache = IdempotencyCache[str, int](max_size=10, ttl=60)
+        assert cache.run("key", "request", lambda: 1) == 1
+        assert cache.run("key", "request", lambda: 2) == 1
+
+    def test_rejects_different_request_with_same_key(self):
+        cache = IdempotencyCache[str, int](max_size=10, ttl=60)
+        cache.run("key", "request", lambda: 1)
+        with pytest.raises(ValueError):
+            cache.run("key", "other request", lambda: 2)
+
+    def test_failures_are_not_remembered(self):
+        cache = IdempotencyCache[str, int](max_size=10, ttl=60)
+
+        def fail() -> int:
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            cache.run("key", "request", fail)
+        assert cache.run("key", "request", lambda: 2) == 2
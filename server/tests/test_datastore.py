@@ -0,0 +1,344 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from typing import Any, Optional, cast
+
+import pytest
+
+from datastore import CachingDataStore, DataStore, InMemoryDataStore, Ordering, ShardedDataStore, SortKey, T
+from models import Loan, LoanPayment
+from services import LoanFilterFn
+from tests.factories import LoanFactory, LoanPaymentFactory
+
+SHARD_COUNT = 3
+
+
+@pytest.fixture
+def sharded_payment_datastore(loan_datastore: InMemoryDataStore[Loan]) -> ShardedDataStore[LoanPayment]:
+    store = ShardedDataStore[LoanPayment](
+        shards=[InMemoryDataStore[LoanPayment](initial_items=[]) for _ in range(SHARD_COUNT)],
+        partition_key=lambda payment: payment.loan_id,
+    )
+    loans, _ = loan_datastore.get_all(cursor=None, limit=None)
+    for loan in loans:
+        for _ in range(3):
+            store.add(cast(LoanPayment, LoanPaymentFactory(loan=loan)))
+    return store
+
+
+class TestShardedDataStore:
+    def test_get_all_pages_through_every_shard_in_id_order(self, sharded_payment_datastore: ShardedDataStore[LoanPayment]):
+        seen: list[LoanPayment] = []
+        cursor = None
+        while True:
+            items, pagination = sharded_payment_datastore.get_all(
+                cursor=cursor, limit=4)
+            seen.extend(items)
+            assert pagination.total_items == 15
+            if pagination.next_cursor is None:
+                break
+            cursor = pagination.next_cursor
+
+        assert len(seen) == 15
+        assert [payment.id for payment in seen] == sorted(
+            payment.id for payment in seen)
+
+    def test_get_all_pages_in_id_order_when_inserted_out_of_order(self, loan_datastore: InMemoryDataStore[Loan]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        store = ShardedDataStore[LoanPayment](
+            shards=[InMemoryDataStore[LoanPayment](initial_items=[]) for _ in range(2)],
+            partition_key=lambda payment: payment.id % 2,
+        )
+        for payment_id in [3, 1, 2, 4]:
+            store.add(cast(LoanPayment, LoanPaymentFactory(loan=loan, id=payment_id)))
+
+        seen: list[int] = []
+        cursor = None
+        while True:
+            items, pagination = store.get_all(cursor=cursor, limit=1)
+            seen.extend(payment.id for payment in items)
+            if pagination.next_cursor is None:
+                break
+            cursor = pagination.next_cursor
+        assert seen == [1, 2, 3, 4]
+
+    def test_add_many_is_one_write_per_shard_and_all_or_nothing(self, sharded_payment_datastore: ShardedDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan], mocker):
+        loans, _ = loan_datastore.get_all(cursor=None, limit=None)
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for loan in loans]
+        existing = sharded_payment_datastore.get_all(cursor=None, limit=1)[0][0]
+
+        with pytest.raises(ValueError):
+            sharded_payment_datastore.add_many([*payments, existing])
+        assert all(sharded_payment_datastore.get_by_id(payment.id) is None for payment in payments)
+
+        shard_adds = [mocker.spy(shard, "add_many") for shard in sharded_payment_datastore._shards]
+        assert sharded_payment_datastore.add_many(payments) == payments
+        assert all(add.call_count <= 1 for add in shard_adds)
+        assert all(sharded_payment_datastore.get_by_id(payment.id) == payment for payment in payments)
+
+    def test_get_all_with_filter(self, sharded_payment_datastore: ShardedDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        items, pagination = sharded_payment_datastore.get_all(
+            cursor=None, limit=None, filter_fn=lambda payment: payment.loan_id == loan.id)
+        assert len(items) == 3
+        assert pagination.total_items == 3
+        assert pagination.next_cursor is None
+
+    def test_get_all_in_partition_reads_one_shard(self, sharded_payment_datastore: ShardedDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan], mocker):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        spies = [mocker.spy(shard, "get_all")
+                 for shard in sharded_payment_datastore._shards]
+        items, _ = sharded_payment_datastore.get_all_in_partition(
+            loan.id, cursor=None, limit=None, filter_fn=lambda payment: payment.loan_id == loan.id)
+        assert len(items) == 3
+        assert sum(spy.call_count for spy in spies) == 1
+
+    def test_get_by_id(self, sharded_payment_datastore: ShardedDataStore[LoanPayment]):
+        items, _ = sharded_payment_datastore.get_all(cursor=None, limit=None)
+        assert sharded_payment_datastore.get_by_id(items[-1].id) == items[-1]
+        assert sharded_payment_datastore.get_by_id(-1) is None
+
+
+class TestInMemoryDataStore:
+    def test_add_many_is_all_or_nothing(self, payment_datastore: InMemoryDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        existing = payment_datastore.get_all(cursor=None, limit=1)[0][0]
+        new_payment = cast(LoanPayment, LoanPaymentFactory(loan=loan))
+
+        with pytest.raises(ValueError):
+            payment_datastore.add_many([new_payment, existing])
+        assert payment_datastore.get_by_id(new_payment.id) is None
+
+        assert payment_datastore.add_many([new_payment]) == [new_payment]
+        assert payment_datastore.get_by_id(new_payment.id) == new_payment
+
+
+class TestChangeFeed:
+    def test_listener_called_on_add(self, payment_datastore: InMemoryDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan]):
+        received: list[LoanPayment] = []
+        payment_datastore.changes.listen(received.append)
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        payment = cast(LoanPayment, LoanPaymentFactory(loan=loan))
+        payment_datastore.add(payment)
+        assert received == [payment]
+
+    def test_failing_listener_does_not_fail_add(self, payment_datastore: InMemoryDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan]):
+        def fail(_: LoanPayment) -> None:
+            raise RuntimeError("listener bug")
+
+        received: list[LoanPayment] = []
+        payment_datastore.changes.listen(fail)
+        payment_datastore.changes.listen(received.append)
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        payment = cast(LoanPayment, LoanPaymentFactory(loan=loan))
+
+        assert payment_datastore.add(payment) == payment
+        assert received == [payment]
+
+    def test_subscription_on_closed_loop_is_dropped(self, payment_datastore: InMemoryDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan]):
+        async def subscribe() -> None:
+            # Never closed, as when a subscriber's event loop shuts down under it
+            payment_datastore.changes.subscribe()
+
+        asyncio.run(subscribe())
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        payment_datastore.add(cast(LoanPayment, LoanPaymentFactory(loan=loan)))
+        assert payment_datastore.changes._listeners == []
+
+    def test_subscription_filters_items(self, payment_datastore: InMemoryDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan]):
+        loans, _ = loan_datastore.get_all(cursor=None, limit=2)
+
+        async def run() -> LoanPayment:
+            with payment_datastore.changes.subscribe(filter_fn=lambda payment: payment.loan_id == loans[1].id) as subscription:
+                payment_datastore.add(cast(LoanPayment, LoanPaymentFactory(loan=loans[0])))
+                payment_datastore.add(cast(LoanPayment, LoanPaymentFactory(loan=loans[1])))
+                return await asyncio.wait_for(subscription.__anext__(), timeout=1)
+
+        assert asyncio.run(run()).loan_id == loans[1].id
+
+    def test_slow_subscriber_drops_oldest(self, payment_datastore: InMemoryDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for _ in range(5)]
+
+        async def run() -> tuple[list[LoanPayment], int]:
+            with payment_datastore.changes.subscribe(max_pending=2) as subscription:
+                for payment in payments:
+                    payment_datastore.add(payment)
+                # Let the loop deliver the queued items
+                await asyncio.sleep(0)
+                received = [await subscription.__anext__() for _ in range(2)]
+                return received, subscription.dropped
+
+        received, dropped = asyncio.run(run())
+        assert received == payments[-2:]
+        assert dropped == 3
+
+
+LOAN_ORDERS = [
+    (SortKey("principal", descending=True),),
+    (SortKey("due_date"), SortKey("name", descending=True)),
+    (),
+]
+
+
+def _page_through(datastore: DataStore[T], order_by: Ordering, limit: int, **kwargs: Any) -> list[T]:
+    seen: list[T] = []
+    after = None
+    while True:
+        items, pagination = datastore.get_all_sorted(order_by, after=after, limit=limit, **kwargs)
+        seen.extend(items)
+        if pagination.end_cursor is None:
+            return seen
+        after = pagination.end_cursor
+
+
+def _expected_order(items: list[Loan], order_by: Ordering) -> list[Loan]:
+    expected = sorted(items, key=lambda item: item.id)
+    for key in reversed(order_by):
+        expected.sort(key=lambda item: getattr(item, key.field), reverse=key.descending)
+    return expected
+
+
+class TestSortedPagination:
+    @pytest.mark.parametrize("order_by", LOAN_ORDERS, ids=str)
+    def test_pages_follow_order(self, loan_datastore: InMemoryDataStore[Loan], order_by: Ordering):
+        loans, _ = loan_datastore.get_all(cursor=None, limit=None)
+        assert _page_through(loan_datastore, order_by, limit=2) == _expected_order(loans, order_by)
+
+    @pytest.mark.parametrize("order_by", LOAN_ORDERS, ids=str)
+    def test_fallback_matches_index(self, loan_datastore: InMemoryDataStore[Loan], order_by: Ordering):
+        expected = loan_datastore.get_all_sorted(order_by, after=None, limit=3)
+        assert DataStore.get_all_sorted(loan_datastore, order_by, after=None, limit=3) == expected
+
+    def test_index_catches_up_with_new_items(self, loan_datastore: InMemoryDataStore[Loan]):
+        order_by = (SortKey("principal"),)
+        loan_datastore.get_all_sorted(order_by, after=None, limit=1)
+        cheapest = cast(Loan, LoanFactory(principal=1.0))
+        loan_datastore.add(cheapest)
+
+        items, pagination = loan_datastore.get_all_sorted(order_by, after=None, limit=1)
+        assert items == [cheapest]
+        assert pagination.total_items == 6
+
+    def test_filter(self, loan_datastore: InMemoryDataStore[Loan]):
+        loans, _ = loan_datastore.get_all(cursor=None, limit=None)
+        threshold = sorted(loan.principal for loan in loans)[2]
+        order_by = (SortKey("principal", descending=True),)
+
+        items, pagination = loan_datastore.get_all_sorted(
+            order_by, after=None, limit=2, filter_fn=lambda loan: loan.principal <= threshold)
+        assert [loan.principal for loan in items] == sorted(
+            (loan.principal for loan in loans if loan.principal <= threshold), reverse=True)[:2]
+        assert pagination.total_items == 3
+        assert pagination.end_cursor is not None
+
+    def test_sharded_matches_single_store(self, sharded_payment_datastore: ShardedDataStore[LoanPayment]):
+        payments, _ = sharded_payment_datastore.get_all(cursor=None, limit=100)
+        order_by = (SortKey("amount", descending=True),)
+        single = InMemoryDataStore[LoanPayment](initial_items=list(payments))
+        assert _page_through(sharded_payment_datastore, order_by, limit=4) == _page_through(single, order_by, limit=4)
+
+    def test_partition(self, sharded_payment_datastore: ShardedDataStore[LoanPayment]):
+        payment = sharded_payment_datastore.get_all(cursor=None, limit=1)[0][0]
+        partitioned = InMemoryDataStore[LoanPayment](
+            initial_items=sharded_payment_datastore.get_all(cursor=None, limit=100)[0],
+            partition_key=lambda item: item.loan_id)
+
+        items = _page_through(partitioned, (SortKey("amount"),), limit=2, partition_key=payment.loan_id,
+                              filter_fn=lambda item: item.loan_id == payment.loan_id)
+        assert len(items) == 3
+        assert {item.loan_id for item in items} == {payment.loan_id}
+        assert [item.amount for item in items] == sorted(item.amount for item in items)
+
+    def test_cursor_must_match_order(self, loan_datastore: InMemoryDataStore[Loan]):
+        _, pagination = loan_datastore.get_all_sorted((SortKey("name"),), after=None, limit=1)
+        assert pagination.end_cursor is not None
+
+        with pytest.raises(ValueError):
+            loan_datastore.get_all_sorted((SortKey("principal"),), after=pagination.end_cursor, limit=1)
+        with pytest.raises(ValueError):
+            loan_datastore.get_all_sorted((SortKey("name"),), after="not-a-cursor", limit=1)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCachingDataStore:
+    def test_get_by_id_hits_cache(self, loan_datastore: InMemoryDataStore[Loan], mocker):
+        cached = CachingDataStore[Loan](loan_datastore, max_size=10, ttl=60)
+        spy = mocker.spy(loan_datastore, "get_by_id")
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+
+        assert cached.get_by_id(loan.id) == loan
+        assert cached.get_by_id(loan.id) == loan
+        assert spy.call_count == 1
+        assert cached.record_stats.hits == 1
+        assert cached.record_stats.hit_rate == 0.5
+
+    def test_records_expire(self, loan_datastore: InMemoryDataStore[Loan], mocker):
+        clock = FakeClock()
+        cached = CachingDataStore[Loan](loan_datastore, max_size=10, ttl=60, clock=clock)
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        spy = mocker.spy(loan_datastore, "get_by_id")
+
+        cached.get_by_id(loan.id)
+        clock.now = 30
+        cached.get_by_id(loan.id)
+        assert spy.call_count == 1
+        clock.now = 61
+        cached.get_by_id(loan.id)
+        assert spy.call_count == 2
+
+    def test_pages_cached_for_value_filters_only(self, loan_datastore: InMemoryDataStore[Loan], mocker):
+        cached = CachingDataStore[Loan](loan_datastore, max_size=10, ttl=60)
+        spy = mocker.spy(loan_datastore, "get_all")
+
+        for _ in range(2):
+            cached.get_all(cursor=None, limit=2, filter_fn=LoanFilterFn(principal=50_000.0))
+        assert spy.call_count == 1
+
+        for _ in range(2):
+            cached.get_all(cursor=None, limit=2, filter_fn=lambda loan: loan.principal <= 50_000.0)
+        assert spy.call_count == 3
+        assert cached.page_stats.hits == 1
+
+    def test_add_writes_through_and_clears_pages(self, loan_datastore: InMemoryDataStore[Loan], mocker):
+        cached = CachingDataStore[Loan](loan_datastore, max_size=10, ttl=60)
+        _, before = cached.get_all(cursor=None, limit=2)
+
+        added = cached.add(cast(Loan, LoanFactory()))
+        # Also through the backend directly
+        loan_datastore.add(cast(Loan, LoanFactory()))
+
+        spy = mocker.spy(loan_datastore, "get_by_id")
+        assert cached.get_by_id(added.id) == added
+        assert spy.call_count == 0
+        _, after = cached.get_all(cursor=None, limit=2)
+        assert after.total_items == before.total_items + 2
+
+    def test_concurrent_misses_load_once(self, loan_datastore: InMemoryDataStore[Loan], mocker):
+        cached = CachingDataStore[Loan](loan_datastore, max_size=10, ttl=60)
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        release = threading.Event()
+        get_by_id = loan_datastore.get_by_id
+
+        def slow_get_by_id(item_id: int) -> Optional[Loan]:
+            release.wait(timeout=1)
+            return get_by_id(item_id)
+
+        backend = mocker.patch.object(loan_datastore, "get_by_id", side_effect=slow_get_by_id)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(cached.get_by_id, loan.id) for _ in range(4)]
+            # Let every caller reach the single-flight before the backend answers
+            time.sleep(0.05)
+            release.set()
+            results = [future.result() for future in futures]
+
+        assert backend.call_count == 1
+        assert results == [loan] * 4
@@ -1,8 +1,13 @@
+import asyncio
+from datetime import timedelta
 from typing import Any, cast
 from flask.testing import FlaskClient
+from strawberry.types import ExecutionResult
 
-from models import Loan
+from models import Loan, LoanPayment
 from datastore import InMemoryDataStore
+from schema import schema
+from tests.factories import LoanPaymentFactory
 
 
 class TestGraphQLRoute:
@@ -130,3 +135,131 @@ class TestGraphQLRoute:
         assert len(payments) >= 1
         assert all(payment["name"] ==
                    existing_loan.name for payment in payments)
+
+    def test_get_overdue_loans(self, client: FlaskClient, loan_datastore: InMemoryDataStore[Loan]):
+        # The first loan has no payments (see conftest), so it defaults 31 days after its due date
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        as_of = (loan.due_date + timedelta(days=31)).isoformat()
+        query = f"""
+        query {{
+            overdueLoans(status: DEFAULTED, asOf: "{as_of}") {{
+                id
+                name
+            }}
+        }}
+        """
+        data = client.post("/graphql", json={"query": query}).get_json()
+        assert data is not None
+        assert {"id": loan.id, "name": loan.name} in data["data"]["overdueLoans"]
+
+    def test_get_loans_ordered_by_principal(self, client: FlaskClient, loan_datastore: InMemoryDataStore[Loan]):
+        query = """
+        query Loans($after: String) {
+            loans(orderBy: [{field: PRINCIPAL, direction: DESC}], limit: 2, after: $after) {
+                items { id principal }
+                paginationParams { totalItems endCursor }
+            }
+        }
+        """
+        principals: list[float] = []
+        after = None
+        while True:
+            data = client.post("/graphql", json={"query": query, "variables": {"after": after}}).get_json()
+            assert data is not None
+            loans = data["data"]["loans"]
+            principals.extend(loan["principal"] for loan in loans["items"])
+            after = loans["paginationParams"]["endCursor"]
+            if after is None:
+                break
+
+        all_loans, _ = loan_datastore.get_all(cursor=None, limit=None)
+        assert principals == sorted((loan.principal for loan in all_loans), reverse=True)
+
+    def test_get_loans_ordered_rejects_int_cursor(self, client: FlaskClient):
+        query = """
+        query {
+            loans(orderBy: [{field: NAME}], cursor: 2) { items { id } }
+        }
+        """
+        data = client.post("/graphql", json={"query": query}).get_json()
+        assert data is not None
+        assert data["errors"][0]["message"] == "Sorted results are paged with after, not cursor."
+
+    def test_add_loan_payment_mutation_with_idempotency_key(self, client: FlaskClient, loan_datastore: InMemoryDataStore[Loan]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        mutation = f"""
+        mutation {{
+            addLoanPayment(loanId: {loan.id}, amount: 250.0, idempotencyKey: "mobile-789") {{
+                id
+                loanId
+                amount
+                paymentDate
+            }}
+        }}
+        """
+        first = client.post("/graphql", json={"query": mutation}).get_json()
+        retry = client.post("/graphql", json={"query": mutation}).get_json()
+        assert first is not None and retry is not None
+        assert first["data"]["addLoanPayment"]["loanId"] == loan.id
+        assert first["data"]["addLoanPayment"]["amount"] == 250.0
+        assert retry["data"] == first["data"]
+
+    def test_add_loan_payments_mutation(self, client: FlaskClient, loan_datastore: InMemoryDataStore[Loan]):
+        loans, _ = loan_datastore.get_all(cursor=None, limit=2)
+        mutation = """
+        mutation AddLoanPayments($inputs: [LoanPaymentInput!]!) {
+            addLoanPayments(inputs: $inputs) {
+                id
+                loanId
+                amount
+            }
+        }
+        """
+        inputs = [{"loanId": loan.id, "amount": 10.0} for loan in loans]
+        response = client.post(
+            "/graphql", json={"query": mutation, "variables": {"inputs": inputs}})
+        data = response.get_json()
+        assert data is not None
+        payments = data["data"]["addLoanPayments"]
+        assert [payment["loanId"] for payment in payments] == [loan.id for loan in loans]
+
+    def test_add_loan_payments_mutation_unknown_loan(self, client: FlaskClient):
+        mutation = """
+        mutation {
+            addLoanPayments(inputs: [{loanId: 9999, amount: 10.0}]) {
+                id
+            }
+        }
+        """
+        data = client.post("/graphql", json={"query": mutation}).get_json()
+        assert data is not None
+        assert data["errors"][0]["message"] == "Loan with id 9999 does not exist."
+
+
+class TestGraphQLSubscriptions:
+    def test_payment_added(self, loan_datastore: InMemoryDataStore[Loan], payment_datastore: InMemoryDataStore[LoanPayment]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        payment = cast(LoanPayment, LoanPaymentFactory(loan=loan))
+        query = f"""
+        subscription {{
+            paymentAdded(loanId: {loan.id}) {{
+                id
+                name
+            }}
+        }}
+        """
+
+        async def run() -> dict[str, Any]:
+            subscription = await schema.subscribe(query)
+            assert not isinstance(subscription, ExecutionResult)
+            # The resolver subscribes to the change feed on the first iteration
+            first = asyncio.ensure_future(subscription.__anext__())
+            await asyncio.sleep(0.01)
+            payment_datastore.add(payment)
+            result = await asyncio.wait_for(first, timeout=1)
+            await subscription.aclose()
+            assert result.errors is None
+            return cast(dict[str, Any], result.data)
+
+        data = asyncio.run(run())
+        assert data["paymentAdded"] == {"id": payment.id, "name": loan.name}
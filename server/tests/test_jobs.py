@@ -0,0 +1,106 @@
+import threading
+import time
+from typing import Any, Generator, cast
+
+import pytest
+
+from datastore import InMemoryDataStore
+from jobs import Job, JobRunner, JobStatus
+from models import Loan, LoanPayment, PaymentStatus
+from reports import payment_statuses, payments_export, submit_report
+from services import LoanService
+from tests.factories import LoanPaymentFactory
+
+
+def _wait(job_runner: JobRunner, job: Job, timeout: float = 10.0) -> Job:
+    deadline = time.monotonic() + timeout
+    while True:
+        current = job_runner.get(job.id)
+        assert current is not None
+        if current.finished or time.monotonic() > deadline:
+            return current
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def job_runner() -> Generator[JobRunner, None, None]:
+    runner = JobRunner(max_workers=2, max_finished=2)
+    yield runner
+    runner.shutdown()
+
+
+def _raise(_: None) -> None:
+    raise RuntimeError("boom")
+
+
+class TestJobRunner:
+    def test_runs_collect_then_compute(self, job_runner: JobRunner):
+        job = job_runner.submit("double", lambda: 21, lambda value: value * 2)
+        assert job.status == JobStatus.PENDING
+
+        finished = _wait(job_runner, job)
+        assert finished.status == JobStatus.SUCCEEDED
+        assert finished.result == 42
+        assert finished.finished_at is not None
+
+    def test_failure_is_recorded(self, job_runner: JobRunner):
+        finished = _wait(job_runner, job_runner.submit("fail", lambda: None, _raise))
+        assert finished.status == JobStatus.FAILED
+        assert finished.error == "boom"
+
+    def test_running_job_does_not_block_others(self, job_runner: JobRunner):
+        release = threading.Event()
+        slow = job_runner.submit("slow", lambda: release.wait(timeout=5), lambda value: value)
+        fast = _wait(job_runner, job_runner.submit("fast", lambda: 1, lambda value: value))
+
+        assert fast.status == JobStatus.SUCCEEDED
+        current = job_runner.get(slow.id)
+        assert current is not None and current.status == JobStatus.RUNNING
+        release.set()
+        assert _wait(job_runner, slow).status == JobStatus.SUCCEEDED
+
+    def test_oldest_finished_jobs_are_forgotten(self, job_runner: JobRunner):
+        jobs = [_wait(job_runner, job_runner.submit("job", lambda: None, lambda value: value))
+                for _ in range(3)]
+        assert job_runner.get(jobs[0].id) is None
+        assert job_runner.get(jobs[-1].id) is not None
+
+    def test_compute_in_process_pool(self, loan_service: LoanService):
+        runner = JobRunner(max_workers=1, processes=1)
+        try:
+            job = runner.submit("payment_statuses", loan_service.get_portfolio, payment_statuses)
+            finished = _wait(runner, job, timeout=60)
+        finally:
+            runner.shutdown()
+        assert finished.status == JobStatus.SUCCEEDED
+        assert finished.result == payment_statuses(loan_service.get_portfolio())
+
+
+class TestReports:
+    def test_payment_statuses(self, loan_service: LoanService, loan_with_no_payments: Loan, payment_datastore: InMemoryDataStore[LoanPayment]):
+        payment_datastore.add(cast(LoanPayment, LoanPaymentFactory(loan=loan_with_no_payments, defaulted=True)))
+        loans, payments = loan_service.get_portfolio()
+
+        report = payment_statuses((loans, payments))
+        assert report["payments"]["DEFAULTED"]["count"] == 1
+        assert sum(totals["count"] for totals in report["payments"].values()) == len(payments)
+        assert report["loans_without_payments"] == 0
+
+    def test_payments_export_by_status(self, loan_service: LoanService, loan_with_no_payments: Loan, payment_datastore: InMemoryDataStore[LoanPayment]):
+        late = payment_datastore.add(cast(LoanPayment, LoanPaymentFactory(loan=loan_with_no_payments, late=True)))
+
+        rows = payments_export((loan_service.get_portfolio(), None))
+        late_rows = payments_export((loan_service.get_portfolio(), PaymentStatus.LATE))
+        assert len(rows) == len(loan_service.get_portfolio()[1])
+        assert [row["id"] for row in late_rows] == [late.id]
+        assert late_rows[0]["loan_name"] == loan_with_no_payments.name
+
+    @pytest.mark.parametrize("payload", [
+        {"report": "nope"},
+        {"report": "payment_statuses", "params": {"status": "LATE"}},
+        {"report": "payments_export", "params": {"status": "SOMETIMES"}},
+        [],
+    ])
+    def test_invalid_requests(self, job_runner: JobRunner, loan_service: LoanService, payload: Any):
+        with pytest.raises(ValueError):
+            submit_report(job_runner, loan_service, payload)
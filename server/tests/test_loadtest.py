@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+from loadtest import OPERATIONS, TrafficProfile, percentile
+
+
+class TestTrafficProfile:
+    def test_unknown_operation_rejected(self):
+        with pytest.raises(ValueError):
+            TrafficProfile.from_dict({"operations": {"delete_loan": 1}})
+
+    def test_same_seed_replays_same_requests(self):
+        profile = TrafficProfile.from_dict(
+            {"operations": {name: 1 for name in OPERATIONS}})
+
+        def replay(seed: int) -> list[object]:
+            rng = random.Random(seed)
+            return [OPERATIONS[profile.choose(rng)](rng, 100) for _ in range(50)]
+
+        assert replay(7) == replay(7)
+
+    def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+        assert percentile(values, 50) == 50.0
+        assert percentile(values, 99) == 99.0
+        assert percentile([], 95) == 0.0
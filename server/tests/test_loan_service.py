@@ -1,5 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import cast
-from models import LoanFilter, LoanPayment, PaymentStatus
+from models import LoanFilter, LoanPayment, LoanPaymentInput, PaymentStatus
 from models import Loan
 from datastore import InMemoryDataStore
 from tests.factories import LoanPaymentFactory
@@ -124,3 +125,26 @@ class TestLoanServiceGetLoanPayments:
             loan_id=loan_with_no_payments.id, cursor=None, limit=None)
         assert len(payments) == 1
         assert payments[0].status == PaymentStatus.DEFAULTED
+
+
+class TestLoanServiceAddLoanPayment:
+    def test_concurrent_retries_insert_once(self, loan_service: LoanService, loan_with_no_payments: Loan, payment_datastore: InMemoryDataStore[LoanPayment]):
+        payment_input = LoanPaymentInput(loan_id=loan_with_no_payments.id, amount=50.0)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            payments = list(pool.map(
+                lambda _: loan_service.add_loan_payment(payment_input, idempotency_key="retry"), range(8)))
+
+        assert len({payment.id for payment in payments}) == 1
+        stored, _ = loan_service.get_loan_payments(
+            loan_id=loan_with_no_payments.id, cursor=None, limit=None)
+        assert [payment.id for payment in stored] == [payments[0].id]
+
+    def test_replay_does_not_touch_datastore(self, loan_service: LoanService, loan_with_no_payments: Loan, payment_datastore: InMemoryDataStore[LoanPayment], loan_datastore: InMemoryDataStore[Loan], mocker):
+        payment_input = LoanPaymentInput(loan_id=loan_with_no_payments.id, amount=50.0)
+        first = loan_service.add_loan_payment(payment_input, idempotency_key="replay")
+
+        loan_lookup = mocker.spy(loan_datastore, "get_by_id")
+        payment_add = mocker.spy(payment_datastore, "add")
+        assert loan_service.add_loan_payment(payment_input, idempotency_key="replay") == first
+        assert loan_lookup.call_count == 0
+        assert payment_add.call_count == 0
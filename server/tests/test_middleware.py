@@ -0,0 +1,98 @@
+import gzip
+import json
+from typing import cast
+
+from flask.testing import FlaskClient
+import pytest
+from starlette.testclient import TestClient
+
+from container import Container
+from datastore import InMemoryDataStore
+import middleware
+from models import Loan, LoanPayment
+from services import LoanService
+from tests.factories import LoanFactory
+
+LOANS_QUERY = "{ loans(limit: 50) { items { id name interestRate principal dueDate } } }"
+
+
+@pytest.fixture
+def many_loans(loan_datastore: InMemoryDataStore[Loan]) -> None:
+    # Enough loans for the loans query to pass COMPRESSION_MIN_SIZE
+    loan_datastore.add_many([cast(Loan, LoanFactory()) for _ in range(30)])
+
+
+@pytest.mark.usefixtures("many_loans")
+class TestCompression:
+    def test_gzip(self, client: FlaskClient):
+        plain = client.post("/graphql", json={"query": LOANS_QUERY})
+        response = client.post("/graphql", json={"query": LOANS_QUERY}, headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert len(response.data) < len(plain.data)
+        assert json.loads(gzip.decompress(response.data)) == plain.get_json()
+
+    def test_brotli_preferred(self, client: FlaskClient):
+        if middleware.brotli is None:
+            pytest.skip("No brotli module installed")
+        response = client.post("/graphql", json={"query": LOANS_QUERY}, headers={"Accept-Encoding": "gzip, br"})
+        assert response.headers["Content-Encoding"] == "br"
+        assert json.loads(middleware.brotli.decompress(response.data))["data"]["loans"]["items"]
+
+    def test_small_responses_are_not_compressed(self, client: FlaskClient):
+        response = client.get("/", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+
+
+class TestConditionalGets:
+    def test_unchanged_data_is_not_modified(self, client: FlaskClient, loan_service: LoanService, mocker):
+        first = client.get("/graphql", query_string={"query": LOANS_QUERY})
+        etag = first.headers["ETag"]
+        assert first.status_code == 200
+
+        spy = mocker.spy(loan_service, "get_loans")
+        response = client.get("/graphql", query_string={"query": LOANS_QUERY}, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert spy.call_count == 0
+
+    def test_add_changes_etag(self, client: FlaskClient, loan_datastore: InMemoryDataStore[Loan]):
+        etag = client.get("/graphql", query_string={"query": LOANS_QUERY}).headers["ETag"]
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        assert client.post("/payment", json={"loan_id": loan.id, "amount": 100.0}).status_code == 201
+
+        response = client.get("/graphql", query_string={"query": LOANS_QUERY}, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_etag_depends_on_query(self, client: FlaskClient):
+        etag = client.get("/graphql", query_string={"query": LOANS_QUERY}).headers["ETag"]
+        response = client.get("/graphql", query_string={"query": "{ loans { items { id } } }"}, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+    def test_post_has_no_etag(self, client: FlaskClient):
+        response = client.post("/graphql", json={"query": LOANS_QUERY})
+        assert "ETag" not in response.headers
+
+    def test_workers_with_the_same_epoch_agree(self, loan_datastore: InMemoryDataStore[Loan], payment_datastore: InMemoryDataStore[LoanPayment]):
+        versions = set()
+        for _ in range(2):
+            Container.override(loan_datastore=loan_datastore, payment_datastore=payment_datastore, epoch="run-1")
+            versions.add(Container.data_version())
+        assert len(versions) == 1
+
+    def test_asgi_graphql(self, loan_service: LoanService, mocker):
+        from asgi import app
+
+        with TestClient(app) as client:
+            first = client.get("/graphql", params={"query": LOANS_QUERY})
+            etag = first.headers["ETag"]
+            assert first.status_code == 200
+            assert first.headers["Cache-Control"] == "no-cache"
+
+            spy = mocker.spy(loan_service, "get_loans")
+            response = client.get("/graphql", params={"query": LOANS_QUERY}, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.headers["ETag"] == etag
+            assert spy.call_count == 0
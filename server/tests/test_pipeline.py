@@ -0,0 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from typing import cast
+
+import pytest
+
+from datastore import InMemoryDataStore, ShardedDataStore
+from models import Loan, LoanPayment
+from pipeline import WritePipeline
+from tests.factories import LoanPaymentFactory
+
+
+@pytest.fixture
+def loan(loan_datastore: InMemoryDataStore[Loan]) -> Loan:
+    return loan_datastore.get_all(cursor=None, limit=1)[0][0]
+
+
+class TestWritePipeline:
+    def test_concurrent_writes_are_batched(self, loan: Loan, payment_datastore: InMemoryDataStore[LoanPayment], mocker):
+        # Commits take a while, like a round trip to the replica writer, so writes pile up behind them
+        commit = payment_datastore.add_many
+        add_many = mocker.patch.object(payment_datastore, "add_many",
+                                       side_effect=lambda items: time.sleep(0.005) or commit(items))
+        pipeline = WritePipeline[LoanPayment](payment_datastore, window=0.05)
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for _ in range(20)]
+
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            results = list(pool.map(pipeline.submit, payments))
+
+        assert results == payments
+        assert add_many.call_count < len(payments)
+        for payment in payments:
+            assert payment_datastore.get_by_id(payment.id) == payment
+
+    def test_failing_write_does_not_fail_its_batch(self, loan: Loan, payment_datastore: InMemoryDataStore[LoanPayment]):
+        pipeline = WritePipeline[LoanPayment](payment_datastore, window=0.05)
+        existing = payment_datastore.get_all(cursor=None, limit=1)[0][0]
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for _ in range(5)]
+        outcomes: dict[int, object] = {}
+        barrier = threading.Barrier(6)
+
+        def submit(payment: LoanPayment) -> None:
+            barrier.wait()
+            try:
+                outcomes[payment.id] = pipeline.submit(payment)
+            except ValueError as e:
+                outcomes[payment.id] = e
+
+        threads = [threading.Thread(target=submit, args=(payment,))
+                   for payment in [existing, *payments]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert isinstance(outcomes[existing.id], ValueError)
+        assert all(outcomes[payment.id] == payment for payment in payments)
+
+    def test_submit_many_keeps_order(self, loan: Loan, payment_datastore: InMemoryDataStore[LoanPayment]):
+        pipeline = WritePipeline[LoanPayment](payment_datastore, window=0, max_batch=2)
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for _ in range(5)]
+        assert pipeline.submit_many(payments) == payments
+
+    def test_lone_write_does_not_wait(self, loan: Loan, payment_datastore: InMemoryDataStore[LoanPayment], mocker):
+        sleep = mocker.patch("pipeline.time.sleep")
+        pipeline = WritePipeline[LoanPayment](payment_datastore, window=0.05)
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for _ in range(3)]
+        for payment in payments:
+            assert pipeline.submit(payment) == payment
+        sleep.assert_not_called()
+
+    def test_sharded_store_commits_batches_per_shard(self, loan_datastore: InMemoryDataStore[Loan], mocker):
+        store = ShardedDataStore[LoanPayment](
+            shards=[InMemoryDataStore[LoanPayment](initial_items=[]) for _ in range(3)],
+            partition_key=lambda payment: payment.loan_id,
+        )
+        shard_adds = [mocker.spy(shard, "add_many") for shard in store._shards]
+        shard_lookups = [mocker.spy(shard, "get_by_id") for shard in store._shards]
+        pipeline = WritePipeline[LoanPayment](store, window=0.05)
+        loans, _ = loan_datastore.get_all(cursor=None, limit=None)
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for loan in loans for _ in range(4)]
+
+        with ThreadPoolExecutor(max_workers=len(payments)) as pool:
+            results = list(pool.map(pipeline.submit, payments))
+
+        assert results == payments
+        assert sum(add.call_count for add in shard_adds) < len(payments)
+        assert all(lookup.call_count == 0 for lookup in shard_lookups)
+        for payment in payments:
+            assert store.get_by_id(payment.id) == payment
+
+    def test_submit_many_is_all_or_nothing(self, loan: Loan, payment_datastore: InMemoryDataStore[LoanPayment]):
+        pipeline = WritePipeline[LoanPayment](payment_datastore, window=0, max_batch=2)
+        existing = payment_datastore.get_all(cursor=None, limit=1)[0][0]
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for _ in range(4)]
+
+        # The call is larger than max_batch, yet it is committed in one batch
+        with pytest.raises(ValueError):
+            pipeline.submit_many([*payments, existing])
+        assert all(payment_datastore.get_by_id(payment.id) is None for payment in payments)
+        assert pipeline.submit_many(payments) == payments
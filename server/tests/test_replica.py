@@ -0,0 +1,155 @@
+from pathlib import Path
+import secrets
+import threading
+from multiprocessing.connection import Listener
+from typing import Any, Generator, cast
+
+import pytest
+
+from container import payment_loan_id
+from services import PaymentOfLoan
+from datastore import CachingDataStore, InMemoryDataStore, SortKey
+from models import Loan, LoanPayment, LoanPaymentInput
+from jobs import JobRunner, JobStatus
+from replica import Replica, ReplicaJobStore, ReplicaWriter, SnapshotLog, SnapshotReader
+from tests.factories import LoanFactory, LoanPaymentFactory
+
+
+@pytest.fixture
+def snapshot_log() -> Generator[SnapshotLog, None, None]:
+    log = SnapshotLog(name=f"test_{secrets.token_hex(4)}", capacity=256)
+    yield log
+    log.close()
+
+
+@pytest.fixture
+def writer_address(snapshot_log: SnapshotLog, loan_datastore: InMemoryDataStore[Loan], payment_datastore: InMemoryDataStore[LoanPayment], tmp_path: Path) -> Generator[tuple[str, bytes], None, None]:
+    writer = ReplicaWriter(snapshot_log, stores={
+        "loan": cast(InMemoryDataStore[Any], loan_datastore), "payment": cast(InMemoryDataStore[Any], payment_datastore)})
+    writer.publish_initial()
+    address = str(tmp_path / "writer.sock")
+    authkey = secrets.token_bytes(16)
+    listener = Listener(address, authkey=authkey)
+    threading.Thread(target=writer.serve_forever,
+                     args=(listener,), daemon=True).start()
+    yield address, authkey
+    listener.close()
+
+
+@pytest.fixture
+def replica(snapshot_log: SnapshotLog, writer_address: tuple[str, bytes]) -> Replica:
+    return Replica(snapshot_log.name, *writer_address, kinds=["loan", "payment"])
+
+
+class TestSnapshotLog:
+    def test_reader_sees_records_across_growth(self, snapshot_log: SnapshotLog):
+        reader = SnapshotReader(snapshot_log.name)
+        loans = [cast(Loan, LoanFactory()) for _ in range(20)]
+        snapshot_log.append([("loan", loan) for loan in loans[:2]])
+        assert reader.read_new() == [("loan", loan) for loan in loans[:2]]
+
+        # Well past the 256 byte initial capacity
+        for loan in loans[2:]:
+            snapshot_log.append([("loan", loan)])
+        assert reader.read_new() == [("loan", loan) for loan in loans[2:]]
+        assert reader.read_new() == []
+        reader.close()
+
+
+class TestReplicaDataStore:
+    def test_replica_matches_writer(self, replica: Replica, loan_datastore: InMemoryDataStore[Loan]):
+        expected, _ = loan_datastore.get_all(cursor=None, limit=None)
+        loans, _ = replica.store("loan").get_all(cursor=None, limit=None)
+        assert loans == expected
+
+    def test_add_is_visible_to_all_replicas(self, replica: Replica, snapshot_log: SnapshotLog, loan_datastore: InMemoryDataStore[Loan]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        payment = cast(LoanPayment, LoanPaymentFactory(loan=loan))
+        replica.store("payment").add(payment)
+
+        other = Replica(snapshot_log.name, "", b"", kinds=["payment"])
+        assert other.store("payment").get_by_id(payment.id) == payment
+        # Versions count replayed writes, so every replica agrees on them
+        assert other.store("payment").version == replica.store("payment").version
+
+    def test_add_duplicate_raises_value_error(self, replica: Replica, payment_datastore: InMemoryDataStore[LoanPayment]):
+        existing = payment_datastore.get_all(cursor=None, limit=1)[0][0]
+        with pytest.raises(ValueError):
+            replica.store("payment").add(existing)
+
+    def test_add_many_is_one_write_and_all_or_nothing(self, replica: Replica, loan_datastore: InMemoryDataStore[Loan], payment_datastore: InMemoryDataStore[LoanPayment], mocker):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        existing = payment_datastore.get_all(cursor=None, limit=1)[0][0]
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for _ in range(3)]
+        writes = mocker.spy(replica, "_write")
+
+        with pytest.raises(ValueError):
+            replica.store("payment").add_many([*payments, existing])
+        assert all(payment_datastore.get_by_id(payment.id) is None for payment in payments)
+
+        assert replica.store("payment").add_many(payments) == payments
+        assert writes.call_count == 2
+        assert all(replica.store("payment").get_by_id(payment.id) == payment for payment in payments)
+
+    def test_sorted_reads_of_one_partition(self, replica: Replica, snapshot_log: SnapshotLog, loan_datastore: InMemoryDataStore[Loan]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        payments = [cast(LoanPayment, LoanPaymentFactory(loan=loan)) for _ in range(3)]
+        for payment in payments:
+            replica.store("payment").add(payment)
+
+        partitioned = Replica(snapshot_log.name, "", b"", kinds=["payment"],
+                              partition_keys={"payment": payment_loan_id})
+        items, pagination = partitioned.store("payment").get_all_sorted(
+            (SortKey("amount"),), after=None, limit=10, partition_key=loan.id)
+        assert items == sorted(payments, key=lambda payment: (payment.amount, payment.id))
+        assert pagination.total_items == 3
+
+    def test_idempotent_add_from_two_replicas_adds_once(self, replica: Replica, snapshot_log: SnapshotLog, writer_address: tuple[str, bytes], loan_datastore: InMemoryDataStore[Loan], payment_datastore: InMemoryDataStore[LoanPayment]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        request = LoanPaymentInput(loan_id=loan.id, amount=100.0)
+        other = Replica(snapshot_log.name, *writer_address, kinds=["payment"])
+        _, before = payment_datastore.get_all(cursor=None, limit=0)
+
+        # Each worker allocates its own id before the write reaches the writer
+        first = replica.store("payment").add_idempotent(
+            cast(LoanPayment, LoanPaymentFactory(loan=loan, amount=100.0)), "k1", request)
+        retry = other.store("payment").add_idempotent(
+            cast(LoanPayment, LoanPaymentFactory(loan=loan, amount=100.0)), "k1", request)
+
+        assert retry == first
+        _, after = payment_datastore.get_all(cursor=None, limit=0)
+        assert after.total_items == before.total_items + 1
+        with pytest.raises(ValueError, match="different request"):
+            other.store("payment").add_idempotent(
+                cast(LoanPayment, LoanPaymentFactory(loan=loan, amount=200.0)), "k1", LoanPaymentInput(loan_id=loan.id, amount=200.0))
+
+    def test_cache_sees_writes_from_other_replicas(self, replica: Replica, snapshot_log: SnapshotLog, writer_address: tuple[str, bytes], loan_datastore: InMemoryDataStore[Loan]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        cached = CachingDataStore[Any](replica.store("payment"), max_size=10, ttl=60)
+        of_loan = PaymentOfLoan(loan.id)
+        before, _ = cached.get_all(cursor=None, limit=100, filter_fn=of_loan)
+        assert cached.get_all(cursor=None, limit=100, filter_fn=of_loan)[0] is before
+
+        other = Replica(snapshot_log.name, *writer_address, kinds=["payment"])
+        payment = cast(LoanPayment, LoanPaymentFactory(loan=loan))
+        other.store("payment").add(payment)
+
+        after, _ = cached.get_all(cursor=None, limit=100, filter_fn=of_loan)
+        assert after == [*before, payment]
+        assert cached.get_by_id(payment.id) == payment
+
+
+class TestReplicaJobStore:
+    def test_job_is_visible_from_other_replicas(self, replica: Replica, snapshot_log: SnapshotLog, writer_address: tuple[str, bytes]):
+        runner = JobRunner(max_workers=1, store=ReplicaJobStore(replica))
+        try:
+            job = runner.submit("double", lambda: 21, lambda value: value * 2)
+        finally:
+            runner.shutdown()
+
+        other = ReplicaJobStore(Replica(snapshot_log.name, *writer_address, kinds=[]))
+        finished = other.get(job.id)
+        assert finished is not None
+        assert finished.status == JobStatus.SUCCEEDED
+        assert finished.result == 42
+        assert other.get("missing") is None
@@ -1,7 +1,8 @@
+import time
 from typing import Union, cast
 from flask.testing import FlaskClient
 
-from models import Loan
+from models import Loan, LoanPayment
 from datastore import InMemoryDataStore
 from tests.factories import LoanFactory
 
@@ -54,4 +55,55 @@ class TestRestRoutes:
         data = response.get_json()
         assert data is not None
         assert "error" in data
-        assert data["error"] == "Loan with id 9999 does not exist."
\ No newline at end of file
+        assert data["error"] == "Loan with id 9999 does not exist."
+
+    def test_add_loan_payment_idempotency_key_replays_response(self, client: FlaskClient, loan_datastore: InMemoryDataStore[Loan], payment_datastore: InMemoryDataStore[LoanPayment]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        payload: dict[str, Union[float, int]] = {
+            "loan_id": loan.id,
+            "amount": 100.0
+        }
+        headers = {"Idempotency-Key": "callback-123"}
+        _, before = payment_datastore.get_all(cursor=None, limit=0)
+
+        first = client.post("/payment", json=payload, headers=headers)
+        retry = client.post("/payment", json=payload, headers=headers)
+
+        assert first.status_code == 201
+        assert retry.status_code == 201
+        assert retry.get_json() == first.get_json()
+        _, after = payment_datastore.get_all(cursor=None, limit=0)
+        assert after.total_items == before.total_items + 1
+
+    def test_add_loan_payment_idempotency_key_reused_for_other_payload(self, client: FlaskClient, loan_datastore: InMemoryDataStore[Loan]):
+        loan = loan_datastore.get_all(cursor=None, limit=1)[0][0]
+        headers = {"Idempotency-Key": "callback-456"}
+        client.post("/payment", json={"loan_id": loan.id, "amount": 100.0}, headers=headers)
+
+        response = client.post("/payment", json={"loan_id": loan.id, "amount": 200.0}, headers=headers)
+        assert response.status_code == 400
+        data = response.get_json()
+        assert data is not None
+        assert data["error"] == "Idempotency key was already used for a different request."
+
+    def test_report_job(self, client: FlaskClient):
+        response = client.post("/reports", json={"report": "payment_statuses"})
+        assert response.status_code == 202
+        job = response.get_json()
+        assert job is not None
+        assert response.headers["Location"] == f"/reports/{job['id']}"
+
+        deadline = time.monotonic() + 10
+        while job["status"] not in ("succeeded", "failed") and time.monotonic() < deadline:
+            time.sleep(0.01)
+            job = client.get(f"/reports/{job['id']}").get_json()
+        assert job["status"] == "succeeded"
+
+        result = client.get(f"/reports/{job['id']}/result").get_json()
+        assert result is not None
+        assert set(result["result"]["payments"]) == {"UNPAID", "ON_TIME", "LATE", "DEFAULTED"}
+
+    def test_report_job_invalid(self, client: FlaskClient):
+        assert client.post("/reports", json={"report": "nope"}).status_code == 400
+        assert client.get("/reports/nope").status_code == 404
+        assert client.get("/reports/nope/result").status_code == 404
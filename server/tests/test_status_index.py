@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+from typing import cast
+
+import pytest
+
+from datastore import InMemoryDataStore
+from models import Loan, LoanPayment, PaymentStatus
+from services import LoanService
+from status_index import StatusIndex
+from tests.factories import LoanFactory, LoanPaymentFactory
+
+DUE_DATE = date(2025, 3, 1)
+
+
+@pytest.fixture
+def index_datastores() -> tuple[InMemoryDataStore[Loan], InMemoryDataStore[LoanPayment]]:
+    loans = [cast(Loan, LoanFactory(due_date=DUE_DATE - timedelta(days=days)))
+             for days in (0, 10, 40)]
+    return InMemoryDataStore[Loan](loans), InMemoryDataStore[LoanPayment]([])
+
+
+class TestStatusIndex:
+    def test_unpaid_loans_move_buckets_as_time_passes(self, index_datastores: tuple[InMemoryDataStore[Loan], InMemoryDataStore[LoanPayment]]):
+        loan_data, payment_data = index_datastores
+        index = StatusIndex(loan_data, payment_data)
+        loans, _ = loan_data.get_all(cursor=None, limit=None)
+
+        assert index.loans_with_status(PaymentStatus.UNPAID, DUE_DATE) == [loans[0]]
+        assert index.loans_with_status(PaymentStatus.LATE, DUE_DATE) == [loans[1]]
+        assert index.loans_with_status(PaymentStatus.DEFAULTED, DUE_DATE) == [loans[2]]
+
+        later = DUE_DATE + timedelta(days=25)
+        assert index.loans_with_status(PaymentStatus.UNPAID, later) == []
+        assert index.loans_with_status(PaymentStatus.LATE, later) == [loans[0]]
+        assert set(loan.id for loan in index.loans_with_status(
+            PaymentStatus.DEFAULTED, later)) == {loans[1].id, loans[2].id}
+
+    def test_payment_moves_loan_to_its_status(self, index_datastores: tuple[InMemoryDataStore[Loan], InMemoryDataStore[LoanPayment]]):
+        loan_data, payment_data = index_datastores
+        index = StatusIndex(loan_data, payment_data)
+        loans, _ = loan_data.get_all(cursor=None, limit=None)
+
+        payment_data.add(cast(LoanPayment, LoanPaymentFactory(loan=loans[2], late=True)))
+        assert index.loans_with_status(PaymentStatus.DEFAULTED, DUE_DATE) == []
+        assert loans[2] in index.loans_with_status(PaymentStatus.LATE, DUE_DATE)
+
+        # An earlier payment for the same loan decides its status instead
+        payment_data.add(cast(LoanPayment, LoanPaymentFactory(loan=loans[2])))
+        assert loans[2] not in index.loans_with_status(PaymentStatus.LATE, DUE_DATE)
+        assert index.loans_with_status(PaymentStatus.ON_TIME, DUE_DATE) == [loans[2]]
+
+    def test_loans_paid_after_as_of_count_as_unpaid(self, index_datastores: tuple[InMemoryDataStore[Loan], InMemoryDataStore[LoanPayment]]):
+        loan_data, payment_data = index_datastores
+        index = StatusIndex(loan_data, payment_data)
+        loan = cast(Loan, LoanFactory(due_date=date(2025, 1, 1)))
+        loan_data.add(loan)
+        payment_data.add(cast(LoanPayment, LoanPaymentFactory(loan=loan, payment_date=date(2025, 6, 1))))
+
+        assert loan in index.loans_with_status(PaymentStatus.UNPAID, date(2025, 1, 3))
+        assert loan not in index.loans_with_status(PaymentStatus.DEFAULTED, date(2025, 1, 3))
+        assert loan in index.loans_with_status(PaymentStatus.LATE, date(2025, 1, 20))
+        assert loan in index.loans_with_status(PaymentStatus.DEFAULTED, date(2025, 5, 31))
+        # From the payment date on, the payment decides
+        assert loan in index.loans_with_status(PaymentStatus.DEFAULTED, date(2025, 6, 1))
+        assert loan not in index.loans_with_status(PaymentStatus.ON_TIME, date(2025, 1, 3))
+
+    def test_new_loans_are_indexed(self, index_datastores: tuple[InMemoryDataStore[Loan], InMemoryDataStore[LoanPayment]]):
+        loan_data, payment_data = index_datastores
+        index = StatusIndex(loan_data, payment_data)
+        loan = cast(Loan, LoanFactory(due_date=DUE_DATE - timedelta(days=100)))
+        loan_data.add(loan)
+        assert loan in index.loans_with_status(PaymentStatus.DEFAULTED, DUE_DATE)
+
+
+class TestLoanServiceGetLoansWithStatus:
+    def test_matches_per_payment_status(self, loan_service: LoanService, loan_with_no_payments: Loan, payment_datastore: InMemoryDataStore[LoanPayment]):
+        as_of = loan_with_no_payments.due_date + timedelta(days=60)
+        assert loan_with_no_payments in loan_service.get_loans_with_status(
+            PaymentStatus.DEFAULTED, as_of)
+
+        payment_datastore.add(cast(LoanPayment, LoanPaymentFactory(loan=loan_with_no_payments)))
+        assert loan_with_no_payments not in loan_service.get_loans_with_status(
+            PaymentStatus.DEFAULTED, as_of)
+        assert loan_with_no_payments in loan_service.get_loans_with_status(
+            PaymentStatus.ON_TIME, as_of)